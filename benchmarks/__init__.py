@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks
+~~~~~~~~~~
+
+Benchmarks for heroku.py, run against a local stand-in for the Heroku API.
+
+    $ python -m benchmarks.run --output results.json
+"""
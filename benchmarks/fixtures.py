@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.fixtures
+~~~~~~~~~~~~~~~~~~~
+
+Realistic API payloads, in the shapes the Heroku API returns them.
+"""
+
+#: Default collection sizes, per resource.
+SIZES = {
+    'apps': 500,
+    'ps': 50,
+    'releases': 100,
+    'addons': 20,
+    'config_vars': 50,
+    'features': 30,
+}
+
+STACKS = ('cedar', 'bamboo-mri-1.9.2', 'bamboo-ree-1.8.7')
+PROCESS_TYPES = ('web', 'worker', 'clock')
+STATES = ('up', 'up', 'up', 'starting', 'crashed', 'idle')
+
+
+def _date(i):
+    # The two timestamp formats the API uses.
+    if i % 2:
+        return '2013/0{0}/{1:02d} {2:02d}:{3:02d}:{4:02d} -0700'.format(
+            i % 9 + 1, i % 28 + 1, i % 24, i % 60, (i * 7) % 60)
+
+    return '2013-0{0}-{1:02d}T{2:02d}:{3:02d}:{4:02d}Z'.format(
+        i % 9 + 1, i % 28 + 1, i % 24, i % 60, (i * 7) % 60)
+
+
+def app_name(i):
+    return 'bench-app-{0}'.format(i)
+
+
+def apps(n):
+    return [{
+        'id': 1000 + i,
+        'name': app_name(i),
+        'create_status': 'complete',
+        'created_at': _date(i),
+        'stack': STACKS[i % len(STACKS)],
+        'requested_stack': None,
+        'repo_migrate_status': 'complete',
+        'slug_size': 20000000 + i * 1024,
+        'repo_size': 5000000 + i * 512,
+        'dynos': i % 4 + 1,
+        'workers': i % 3,
+        'owner_email': 'owner{0}@example.com'.format(i % 10),
+        'web_url': 'http://{0}.herokuapp.com/'.format(app_name(i)),
+        'git_url': 'git@heroku.com:{0}.git'.format(app_name(i)),
+        'buildpack_provided_description': 'Python',
+    } for i in range(n)]
+
+
+def processes(app, n):
+    return [{
+        'upid': str(40000000 + i),
+        'process': '{0}.{1}'.format(PROCESS_TYPES[i % len(PROCESS_TYPES)], i // len(PROCESS_TYPES) + 1),
+        'type': PROCESS_TYPES[i % len(PROCESS_TYPES)],
+        'command': 'gunicorn app:app -b 0.0.0.0:$PORT -w 3',
+        'app_name': app,
+        'slug': '1234567_abcdef0_1a2b',
+        'action': STATES[i % len(STATES)],
+        'state': STATES[i % len(STATES)],
+        'pretty_state': '{0} for {1}m'.format(STATES[i % len(STATES)], i),
+        'elapsed': i * 60,
+        'rendezvous_url': None,
+        'attached': False,
+        'transitioned_at': _date(i),
+    } for i in range(n)]
+
+
+def releases(n):
+    return [{
+        'name': 'v{0}'.format(i + 1),
+        'descr': 'Deploy {0:07x}'.format(i * 2654435761 % (1 << 28)),
+        'user': 'dev{0}@example.com'.format(i % 5),
+        'commit': '{0:07x}'.format(i * 2654435761 % (1 << 28)),
+        'addons': ['heroku-postgresql:dev', 'pgbackups:plus'],
+        'created_at': _date(i),
+        'env': dict(('VAR_{0}'.format(k), 'value-{0}-{1}'.format(i, k)) for k in range(10)),
+        'pstable': {'web': 'gunicorn app:app', 'worker': 'python worker.py'},
+    } for i in range(n)]
+
+
+def addons(n):
+    return [{
+        'name': 'addon-{0}:plan-{1}'.format(i, i % 3),
+        'description': 'Add-on {0}'.format(i),
+        'url': 'https://addons.heroku.com/addon-{0}'.format(i),
+        'state': 'public' if i % 4 else 'beta',
+        'beta': not i % 4,
+        'configured': True,
+        'attachable': False,
+        'attachment_name': None,
+        'price': {'cents': 500 * (i % 3), 'unit': 'month'},
+    } for i in range(n)]
+
+
+def config_vars(n):
+    return dict(('VAR_{0}'.format(i), 'value-{0}-{1}'.format(i, 'x' * (i % 40)))
+                for i in range(n))
+
+
+def features(n):
+    return [{
+        'name': 'feature-{0}'.format(i),
+        'kind': 'user' if i % 3 == 0 else 'app',
+        'summary': 'Experimental feature {0}.'.format(i),
+        'docs': 'https://devcenter.heroku.com/articles/labs-feature-{0}'.format(i),
+        'enabled': bool(i % 2),
+    } for i in range(n)]
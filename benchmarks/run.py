@@ -0,0 +1,606 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.run
+~~~~~~~~~~~~~~
+
+Runs the benchmark suite against a local StubServer, and saves the
+results as JSON for comparing runs::
+
+    $ python -m benchmarks.run --output before.json
+    $ python -m benchmarks.run --output after.json --compare before.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from dateutil.parser import parse as dateutil_parse
+
+import heroku
+from heroku.api import Heroku
+from heroku.compat import JSON_BACKENDS
+from heroku.helpers import parse_datetime
+from heroku.models import Addon, App, Feature, Process, Release
+from heroku.structures import KeyedListResource, ProcessListResource
+
+from . import fixtures
+from .server import StubServer, make_certificate
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# e.g. 'import time:       516 |      12345 | heroku', top-level imports only.
+IMPORTTIME_RE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \| (\S+)$', re.M)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: The registered benchmarks, in the order they run.
+BENCHMARKS = []
+
+#: Objects (or timestamps) built by the memory and date parsing benchmarks.
+OBJECTS = 100000
+
+
+def benchmark(func):
+    """Registers a benchmark; it's called with a Context, returns a dict."""
+    BENCHMARKS.append(func)
+    return func
+
+
+class Context(object):
+    """What every benchmark is handed: the server, and the run's options."""
+
+    def __init__(self, server, repeat, objects=OBJECTS):
+        super(Context, self).__init__()
+
+        self.server = server
+        self.repeat = repeat
+        self.objects = objects
+
+    def client(self, **kwargs):
+        """Returns a Heroku instance talking to the stub server."""
+        h = Heroku(**kwargs)
+        h._heroku_url = self.server.url
+
+        return h
+
+    def timed(self, func, number=1):
+        """Returns the best and median seconds of one call to func."""
+
+        runs = []
+
+        for _ in range(self.repeat):
+            started = timer()
+            for _ in range(number):
+                func()
+            runs.append((timer() - started) / number)
+
+        runs.sort()
+
+        return {'best': runs[0], 'median': runs[len(runs) // 2]}
+
+
+def _models(n):
+    """(model, payload) pairs for hydration and memory benchmarks."""
+    return (
+        (App, fixtures.apps(n)),
+        (Process, fixtures.processes('bench-app-0', n)),
+        (Release, fixtures.releases(n)),
+        (Addon, fixtures.addons(n)),
+        (Feature, fixtures.features(n)),
+    )
+
+
+class _DictBacked(object):
+    """A model's fields in a plain __dict__, as models held them before
+    they were slot-backed; the memory benchmark's baseline.
+
+    Subclass it per model: instances of a class share their dict keys.
+    """
+
+    def __init__(self, item):
+        self._h = item._h
+        self.app = getattr(item, 'app', None)
+
+        for k in item._fields():
+            setattr(self, k, getattr(item, k, None))
+
+
+@benchmark
+def list_throughput(ctx):
+    """End-to-end GET /apps, decoded and hydrated, per client option."""
+
+    n = ctx.server.sizes['apps']
+    results = {}
+
+    options = (
+        ('default', {}),
+        ('lazy', {'lazy': True}),
+        ('cached', {'cache': True}),
+        ('paged', {'page_size': max(n // 5, 1)}),
+        ('paged_read_ahead', {'page_size': max(n // 5, 1), 'read_ahead': True}),
+    )
+
+    for (label, kwargs) in options:
+        h = ctx.client(**kwargs)
+        t = ctx.timed(lambda: len(h.apps))
+
+        results[label] = {
+            'seconds': t['median'],
+            'items_per_second': n / t['median'],
+        }
+
+    return results
+
+
+@benchmark
+def hydration(ctx):
+    """new_from_dict cost, in microseconds per object, per model."""
+
+    n = 1000
+    results = {}
+
+    for (model, payload) in _models(n):
+        for lazy in (False, True):
+            t = ctx.timed(lambda: [model.new_from_dict(d, lazy=lazy) for d in payload])
+
+            label = model.__name__ + ('_lazy' if lazy else '')
+            results[label] = {'us_per_object': t['median'] / n * 1e6}
+
+    return results
+
+
+@benchmark
+def keyed_lookup(ctx):
+    """KeyedListResource.get by primary key: the index vs a linear scan."""
+
+    n = ctx.server.sizes['apps']
+    apps = [App.new_from_dict(d) for d in fixtures.apps(n)]
+    names = [app.name for app in apps]
+
+    def linear(items, key):
+        for item in items:
+            if key in item._ids:
+                return item
+
+    def build():
+        KeyedListResource(items=apps).get(names[-1])
+
+    lr = KeyedListResource(items=apps)
+    lr.get(names[0])
+
+    indexed = ctx.timed(lambda: [lr.get(name) for name in names])
+    scanned = ctx.timed(lambda: [linear(apps, name) for name in names])
+
+    return {
+        'items': n,
+        'indexed_us_per_lookup': indexed['median'] / n * 1e6,
+        'linear_us_per_lookup': scanned['median'] / n * 1e6,
+        'index_build_ms': ctx.timed(build)['median'] * 1e3,
+    }
+
+
+@benchmark
+def memory(ctx):
+    """Bytes allocated per hydrated object, per model, against the same
+    fields held in a plain __dict__."""
+
+    if tracemalloc is None:
+        return {'skipped': 'tracemalloc is not available'}
+
+    n = ctx.objects
+    results = {'objects': n}
+
+    for (model, payload) in _models(n):
+        dict_backed = type(model.__name__, (_DictBacked,), {})
+
+        builds = (
+            ('', lambda d: model.new_from_dict(d)),
+            ('_lazy', lambda d: model.new_from_dict(d, lazy=True)),
+            ('_dict', lambda d: dict_backed(model.new_from_dict(d))),
+        )
+
+        for (suffix, build) in builds:
+            gc.collect()
+            tracemalloc.start()
+
+            before = tracemalloc.get_traced_memory()[0]
+            objects = [build(d) for d in payload]
+            after = tracemalloc.get_traced_memory()[0]
+
+            tracemalloc.stop()
+            del objects
+
+            results[model.__name__ + suffix] = {'bytes_per_object': (after - before) / float(n)}
+
+    return results
+
+
+@benchmark
+def date_parsing(ctx):
+    """parse_datetime vs dateutil, in microseconds per timestamp."""
+
+    dates = [fixtures._date(i) for i in range(ctx.objects)]
+
+    fast = ctx.timed(lambda: [parse_datetime(d) for d in dates])
+    slow = ctx.timed(lambda: [dateutil_parse(d) for d in dates])
+
+    return {
+        'timestamps': len(dates),
+        'parse_datetime_us': fast['median'] / len(dates) * 1e6,
+        'dateutil_us': slow['median'] / len(dates) * 1e6,
+    }
+
+
+@benchmark
+def columns(ctx):
+    """Total slug_size per stack: per-object loop vs to_columns."""
+
+    n = 100000
+    apps = KeyedListResource(items=[App.new_from_dict(d) for d in fixtures.apps(1000)] * (n // 1000))
+
+    def loop():
+        totals = {}
+        for app in apps:
+            totals[app.stack] = totals.get(app.stack, 0) + app.slug_size
+        return totals
+
+    results = {'items': n, 'loop_ms': ctx.timed(loop)['median'] * 1e3}
+
+    # Columns are built once, then aggregated over as often as needed.
+    for use_numpy in (False, True):
+        try:
+            cols = apps.to_columns(['stack', 'slug_size'], use_numpy=use_numpy)
+        except ImportError:
+            continue
+
+        build = ctx.timed(lambda: apps.to_columns(['stack', 'slug_size'], use_numpy=use_numpy))
+        aggregate = ctx.timed(lambda: cols['stack'].counts(weights=cols['slug_size']))
+
+        label = 'numpy' if use_numpy else 'array'
+        results[label] = {
+            'to_columns_ms': build['median'] * 1e3,
+            'aggregate_ms': aggregate['median'] * 1e3,
+        }
+
+    return results
+
+
+@benchmark
+def query(ctx):
+    """Repeated filters on a process list: list comprehension vs where."""
+
+    n = 10000
+    ps = ProcessListResource(items=[Process.new_from_dict(d) for d in fixtures.processes('bench-app-0', n)])
+
+    def scan():
+        return [p for p in ps if p.state == 'crashed' and p.type == 'worker']
+
+    def indexed():
+        return ps.where(state='crashed', type='worker')
+
+    # The first where builds the indexes; later ones reuse them.
+    start = timer()
+    indexed()
+    first = timer() - start
+
+    return {
+        'items': n,
+        'matches': len(indexed()),
+        'scan_ms': ctx.timed(scan)['median'] * 1e3,
+        'where_first_ms': first * 1e3,
+        'where_ms': ctx.timed(indexed)['median'] * 1e3,
+        'by_type_ms': ctx.timed(lambda: ps['worker'])['median'] * 1e3,
+    }
+
+
+@benchmark
+def json_backends(ctx):
+    """Decoding /apps bodies and encoding config vars, per JSON backend."""
+
+    results = {}
+
+    for n in (10, 100, 1000, 10000):
+        body = json.dumps(fixtures.apps(n)).encode('utf-8')
+        config = fixtures.config_vars(n)
+
+        # What every response used to go through: a str copy, then json.
+        t = ctx.timed(lambda: json.loads(body.decode('utf-8')))
+        results['decode_str_{0}'.format(n)] = {'loads_ms': t['median'] * 1e3}
+
+        for (name, factory) in JSON_BACKENDS:
+            try:
+                backend = factory()
+            except ImportError:
+                continue
+
+            loads = ctx.timed(lambda: backend.loads(body))
+            dumps = ctx.timed(lambda: backend.dumps(config))
+
+            results['{0}_{1}'.format(name, n)] = {
+                'loads_ms': loads['median'] * 1e3,
+                'dumps_ms': dumps['median'] * 1e3,
+            }
+
+    return results
+
+
+@benchmark
+def pool_reuse(ctx):
+    """Sequential GETs with and without keep-alive, and connections opened."""
+
+    n = 100
+    results = {}
+
+    for keep_alive in (True, False):
+        h = ctx.client(keep_alive=keep_alive)
+        ctx.server.reset_stats()
+
+        t = ctx.timed(lambda: [h._get_data(('apps', fixtures.app_name(0))) for _ in range(n)])
+
+        label = 'keep_alive' if keep_alive else 'close'
+        results[label] = {
+            'ms_per_request': t['median'] / n * 1e3,
+            'connections': ctx.server.stats['connections'],
+            'requests': ctx.server.stats['requests'],
+        }
+
+    return results
+
+
+@benchmark
+def pool_threads(ctx):
+    """64 threads sharing one client over HTTPS: throughput, and
+    connections opened per request, per pool option."""
+
+    threads, n = 64, 10
+    directory = tempfile.mkdtemp()
+
+    try:
+        certificate = make_certificate(directory)
+    except (OSError, subprocess.CalledProcessError) as why:
+        shutil.rmtree(directory)
+        return {'skipped': 'no certificate: {0}'.format(why)}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # The default pool discards connections beyond its size, noisily.
+    logger = logging.getLogger('urllib3.connectionpool')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+
+    results = {}
+    options = (
+        ('default', {}),
+        ('pool_maxsize', {'pool_maxsize': threads}),
+        ('close', {'keep_alive': False}),
+    )
+
+    try:
+        with StubServer(ctx.server.sizes, ctx.server.latency, certificate=certificate) as server:
+            for (label, kwargs) in options:
+                h = Heroku(**kwargs)
+                h._heroku_url = server.url
+                # The environment's CA bundle would override verify.
+                h._session.trust_env = False
+                h._session.verify = certificate[0]
+
+                def work(_):
+                    for _ in range(n):
+                        h._get_data(('apps', fixtures.app_name(0)))
+
+                server.reset_stats()
+
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    t = ctx.timed(lambda: list(pool.map(work, range(threads))))
+
+                results[label] = {
+                    'requests_per_second': threads * n / t['median'],
+                    'connections_per_request': server.stats['connections'] / float(server.stats['requests']),
+                }
+    finally:
+        logger.setLevel(level)
+        shutil.rmtree(directory)
+
+    return results
+
+
+@benchmark
+def instrumentation(ctx):
+    """GET /apps with and without the metrics aggregator registered."""
+
+    results = {}
+
+    for metrics in (False, True):
+        h = ctx.client(metrics=metrics or None)
+        t = ctx.timed(lambda: len(h.apps))
+
+        results['metrics' if metrics else 'no_hooks'] = {'seconds': t['median']}
+
+    return results
+
+
+@benchmark
+def release_sync(ctx):
+    """Reading an app's releases: a full fetch vs an incremental sync."""
+
+    results = {}
+
+    for incremental in (False, True):
+        h = ctx.client(incremental_releases=incremental)
+        app = h.apps[fixtures.app_name(0)]
+        app.releases
+
+        t = ctx.timed(lambda: len(app.releases))
+        results['incremental' if incremental else 'full'] = {'seconds': t['median']}
+
+    return results
+
+
+@benchmark
+def snapshot(ctx):
+    """Cold start (apps, then their sub-resources) vs load_snapshot."""
+
+    attrs = ('releases', 'addons', 'config')
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'snapshot.db')
+
+    def cold():
+        apps = ctx.client().apps
+        apps.prefetch(*attrs)
+        return apps
+
+    try:
+        t = ctx.timed(cold)
+        h = ctx.client()
+        collections = h.save_snapshot(path, cold())
+        warm = ctx.timed(lambda: ctx.client().load_snapshot(path))
+        lazy = ctx.timed(lambda: ctx.client(lazy=True).load_snapshot(path))
+
+        return {
+            'collections': collections,
+            'bytes': os.path.getsize(path),
+            'cold_seconds': t['median'],
+            'load_seconds': warm['median'],
+            'load_lazy_seconds': lazy['median'],
+        }
+    finally:
+        shutil.rmtree(tmp)
+
+
+@benchmark
+def import_time(ctx):
+    """Microseconds spent importing heroku, per ``python -X importtime``."""
+
+    if sys.version_info < (3, 7):
+        return {'skipped': '-X importtime needs Python 3.7'}
+
+    statements = (
+        ('import_heroku', 'import heroku'),
+        ('from_key', 'import heroku; heroku.from_key'),
+        ('heroku_api', 'import heroku.api'),
+    )
+
+    results = {}
+
+    for (label, statement) in statements:
+        runs = []
+
+        for _ in range(ctx.repeat):
+            p = subprocess.Popen(
+                [sys.executable, '-X', 'importtime', '-c', statement],
+                cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+            (_, err) = p.communicate()
+
+            runs.append(sum(int(us) for (us, name) in IMPORTTIME_RE.findall(err)
+                            if name.split('.')[0] == 'heroku'))
+
+        runs.sort()
+        results[label] = {'us': runs[len(runs) // 2]}
+
+    return results
+
+
+def compare(results, baseline, path=()):
+    """Yields (path, baseline, current) for every number in both runs."""
+
+    for (k, v) in sorted(results.items()):
+        old = baseline.get(k) if isinstance(baseline, dict) else None
+
+        if isinstance(v, dict):
+            for row in compare(v, old or {}, path + (k,)):
+                yield row
+        elif isinstance(v, (int, float)) and isinstance(old, (int, float)):
+            yield '.'.join(path + (k,)), old, v
+
+
+def run(names=None, sizes=None, latency=0.0, repeat=5, objects=OBJECTS):
+    """Runs the (named) benchmarks, and returns the results document."""
+
+    results = {}
+
+    with StubServer(sizes=sizes, latency=latency) as server:
+        ctx = Context(server, repeat, objects)
+
+        for func in BENCHMARKS:
+            if names and func.__name__ not in names:
+                continue
+
+            print('{0}...'.format(func.__name__), file=sys.stderr)
+            results[func.__name__] = func(ctx)
+
+        meta = {
+            'heroku': heroku.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'sizes': server.sizes,
+            'latency': latency,
+            'repeat': repeat,
+            'objects': objects,
+        }
+
+    return {'meta': meta, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks heroku.py against a local stub API.')
+    parser.add_argument('benchmarks', nargs='*', help='Benchmarks to run (default: all).')
+    parser.add_argument('--output', '-o', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', '-c', help='A results file to compare against.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement.')
+    parser.add_argument('--objects', type=int, default=OBJECTS,
+                        help='Objects (or timestamps) built by the memory and date_parsing benchmarks.')
+    parser.add_argument('--size', action='append', default=[], metavar='RESOURCE=N',
+                        help='Collection size, e.g. apps=2000 (repeatable).')
+
+    args = parser.parse_args(argv)
+
+    sizes = {}
+    for size in args.size:
+        (resource, _, n) = size.partition('=')
+        if resource not in fixtures.SIZES:
+            parser.error('Unknown resource: {0}'.format(resource))
+        sizes[resource] = int(n)
+
+    doc = run(args.benchmarks, sizes, args.latency, args.repeat, args.objects)
+    output = json.dumps(doc, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+        for (name, old, new) in compare(doc['results'], baseline):
+            change = (new / old - 1) * 100 if old else float('nan')
+            print('{0:<60} {1:>14.4f} {2:>14.4f} {3:>+8.1f}%'.format(name, old, new, change),
+                  file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
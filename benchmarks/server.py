@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.server
+~~~~~~~~~~~~~~~~~
+
+A local, threaded stand-in for the Heroku API, serving fixture payloads.
+
+    with StubServer(sizes={'apps': 1000}, latency=0.02) as server:
+        h = Heroku()
+        h._heroku_url = server.url
+"""
+
+from threading import Lock, Thread
+import hashlib
+import json
+import os
+import re
+import ssl
+import subprocess
+import time
+
+from . import fixtures
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+# e.g. 'name ..; max=200', or 'name ]bench-app-199..; max=200'.
+RANGE_RE = re.compile(r'^(\w+) (\]?)([^;]*?)\.\.(?:; *max=(\d+))?')
+
+APP_RE = re.compile(r'^/apps/([^/]+)(?:/(\w+))?$')
+
+
+def make_certificate(directory):
+    """Writes a self-signed certificate for 127.0.0.1 with the openssl
+    command; returns the (certificate, key) paths."""
+
+    cert = os.path.join(directory, 'stub.crt')
+    key = os.path.join(directory, 'stub.key')
+
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+            '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+            '-keyout', key, '-out', cert,
+        ], stdout=devnull, stderr=devnull)
+
+    return cert, key
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Send headers and body in one segment; otherwise Nagle's algorithm
+    # and delayed ACKs add ~40ms to every keep-alive response.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        if self.server.stub.certificate is not None:
+            self.request.do_handshake()
+
+        BaseHTTPRequestHandler.setup(self)
+        self.server.stub._count('connections')
+
+    def _send(self, code, body=b'', headers=None):
+        self.send_response(code)
+
+        for (k, v) in (headers or {}).items():
+            self.send_header(k, v)
+
+        # Tell the client not to reuse a connection we're about to close.
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        n = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(n) if n else b''
+
+    def do_GET(self):
+        stub = self.server.stub
+
+        self._read_body()
+        stub._count('requests')
+
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        path, _, query = self.path.partition('?')
+
+        # Logs: the API hands out a logplex URL, which serves stub.logplex.
+        match = APP_RE.match(path)
+        if match and match.group(2) == 'logs' and match.group(1) in stub._by_name:
+            return self._send(200, '{0}/logplex/{1}'.format(stub.url, match.group(1)).encode('utf-8'))
+
+        if path.startswith('/logplex/'):
+            return self._send(200, stub.next_log())
+
+        items = stub.payload(path, query)
+
+        if items is None:
+            return self._send(404, b'{"error": "Not found."}')
+
+        code, headers = 200, {'Content-Type': 'application/json'}
+
+        # Page through collections, when asked to.
+        page = self.headers.get('Range')
+        if page and isinstance(items, list):
+            items, next_range = stub.page(items, page)
+            code = 206 if next_range else 200
+
+            if next_range:
+                headers['Next-Range'] = next_range
+
+        body = stub.encode(path, query, page, items)
+        etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+        headers['ETag'] = etag
+
+        if self.headers.get('If-None-Match') == etag:
+            stub._count('not_modified')
+            return self._send(304, headers={'ETag': etag})
+
+        self._send(code, body, headers)
+
+    def _write(self):
+        stub = self.server.stub
+
+        body = self._read_body()
+        stub._count('requests')
+        stub._record(self.command, self.path, body)
+
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        path = self.path.partition('?')[0]
+        match = APP_RE.match(path)
+
+        # Config var PUTs answer with the resulting vars, as the API does.
+        if self.command == 'PUT' and match and match.group(2) == 'config_vars':
+            config = stub.update_config(path, json.loads(body.decode('utf-8')))
+            return self._send(200, json.dumps(config).encode('utf-8'),
+                              {'Content-Type': 'application/json'})
+
+        self._send(200, b'{}', {'Content-Type': 'application/json'})
+
+    do_POST = do_PUT = do_DELETE = _write
+
+
+class StubServer(object):
+    """Serves fixture payloads for the read endpoints of the Heroku API.
+
+    :param sizes: Collection sizes, overriding fixtures.SIZES.
+    :param latency: Seconds slept before answering each request.
+    :param certificate: A (certificate, key) pair, to serve HTTPS; see
+        make_certificate.
+    """
+
+    def __init__(self, sizes=None, latency=0.0, host='127.0.0.1', port=0,
+                 certificate=None):
+        super(StubServer, self).__init__()
+
+        self.sizes = dict(fixtures.SIZES, **(sizes or {}))
+        self.latency = latency
+        self.certificate = certificate
+
+        #: Counters: requests, connections and 304s answered.
+        self.stats = {'requests': 0, 'connections': 0, 'not_modified': 0}
+
+        #: The (method, path, body) of each write received.
+        self.writes = []
+
+        #: Bodies served by successive logplex connections; once they
+        #: run out, connections end straight away.
+        self.logplex = []
+
+        self._apps = fixtures.apps(self.sizes['apps'])
+        self._by_name = dict((app['name'], app) for app in self._apps)
+        self._payloads = {}
+        self._bodies = {}
+        self._lock = Lock()
+
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.stub = self
+
+        if certificate is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*certificate)
+
+            # Handshakes happen in each handler thread, not in accept().
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True, do_handshake_on_connect=False)
+        self._thread = None
+
+    def __repr__(self):
+        return '<stub-server {0} {1}>'.format(self.url, self.stats)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        scheme = 'https' if self.certificate else 'http'
+        return '{0}://{1}:{2}'.format(scheme, *self._server.server_address[:2])
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._server.serve_forever, name='heroku-stub-server')
+            self._thread.daemon = True
+            self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            for k in self.stats:
+                self.stats[k] = 0
+
+            del self.writes[:]
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def next_log(self):
+        with self._lock:
+            return self.logplex.pop(0) if self.logplex else b''
+
+    def _record(self, method, path, body):
+        with self._lock:
+            self.writes.append((method, path, body))
+
+    def set_payload(self, path, payload):
+        """Replaces the payload served at a path."""
+
+        with self._lock:
+            self._payloads[(path, '')] = payload
+
+            for key in [key for key in self._bodies if key[0] == path]:
+                del self._bodies[key]
+
+    def update_config(self, path, changes):
+        """Applies config var changes (None deletes a var); returns the
+        resulting vars."""
+
+        with self._lock:
+            config = dict(self.payload(path))
+
+            for (key, value) in changes.items():
+                if value is None:
+                    config.pop(key, None)
+                else:
+                    config[key] = value
+
+        self.set_payload(path, config)
+
+        return config
+
+    def payload(self, path, query=''):
+        """Returns the (decoded) payload served at a path, or None."""
+
+        key = (path, query)
+        payload = self._payloads.get(key)
+
+        if payload is None:
+            payload = self._payloads[key] = self._build(path, query)
+
+        return payload
+
+    def _build(self, path, query):
+        sizes = self.sizes
+
+        if path == '/apps':
+            return self._apps
+
+        if path == '/addons':
+            return fixtures.addons(sizes['addons'])
+
+        if path == '/features':
+            return fixtures.features(sizes['features'])
+
+        match = APP_RE.match(path)
+        if match is None or match.group(1) not in self._by_name:
+            return None
+
+        name, collection = match.groups()
+
+        if collection is None:
+            return self._by_name[name]
+
+        if collection == 'ps':
+            return fixtures.processes(name, sizes['ps'])
+
+        if collection == 'releases':
+            return fixtures.releases(sizes['releases'])
+
+        if collection == 'addons':
+            return fixtures.addons(sizes['addons'])
+
+        if collection == 'config_vars':
+            return fixtures.config_vars(sizes['config_vars'])
+
+    def page(self, items, header):
+        """Returns the page of items a Range header asks for, and the
+        Next-Range header value (None on the last page)."""
+
+        match = RANGE_RE.match(header)
+        if match is None:
+            return items, None
+
+        key, exclusive, start, size = match.groups()
+        size = int(size) if size else 200
+
+        offset = 0
+        if start:
+            for (i, item) in enumerate(items):
+                if str(item.get(key)) == start:
+                    offset = i + 1 if exclusive else i
+                    break
+
+        page = items[offset:offset + size]
+
+        if offset + size >= len(items) or not page:
+            return page, None
+
+        return page, '{0} ]{1}..; max={2}'.format(key, page[-1].get(key), size)
+
+    def encode(self, path, query, page, items):
+        """Returns the JSON body of a response, encoded once per request shape."""
+
+        key = (path, query, page)
+        body = self._bodies.get(key)
+
+        if body is None:
+            body = self._bodies[key] = json.dumps(items).encode('utf-8')
+
+        return body
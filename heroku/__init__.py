@@ -24,4 +24,42 @@ __version__ = '0.1.3'
 
 # Module namespace.
 
-from .core import from_key, get_key, from_pass
\ No newline at end of file
+import sys
+
+#: Public names, and the submodules they are imported from on first use.
+_lazy = {
+    'from_key': 'core',
+    'get_key': 'core',
+    'from_pass': 'core',
+}
+
+__all__ = list(_lazy)
+
+#: Submodules that importing the package used to make available, too.
+_submodules = (
+    'api', 'cache', 'columns', 'compat', 'core', 'helpers', 'instrumentation',
+    'models', 'snapshot', 'streams', 'structures', 'throttle', 'watch',
+)
+
+if sys.version_info >= (3, 7):
+    from importlib import import_module
+
+    def __getattr__(name):
+        # Defers requests, dateutil and the models until they're needed.
+        if name in _submodules:
+            return import_module('.' + name, __name__)
+
+        try:
+            module = _lazy[name]
+        except KeyError:
+            raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+        value = getattr(import_module('.' + module, __name__), name)
+        globals()[name] = value
+
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy) | set(_submodules))
+else:
+    from .core import from_key, get_key, from_pass
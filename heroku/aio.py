@@ -0,0 +1,723 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.aio
+~~~~~~~~~~
+
+This module provides an asyncio interface for Heroku, built on aiohttp.
+
+Models are hydrated through the same ``new_from_dict`` as the blocking
+client; only the methods that talk to the API become coroutines::
+
+    async with AsyncHeroku(concurrency=200) as h:
+        await h.authenticate(api_key)
+        apps = await h.apps
+        processes = await asyncio.gather(*[app.processes for app in apps])
+"""
+
+import asyncio
+import time
+from urllib.parse import quote
+
+import aiohttp
+from requests.exceptions import HTTPError
+
+from .api import HEROKU_URL, HerokuCore
+from .compat import json_dumps, json_loads
+from .models import (
+    Account, Addon, App, Collaborator, ConfigVars, Domain, Feature, Key,
+    Process, Release
+)
+from .structures import (
+    KeyedListResource, ProcessListResource, SSHKeyListResource,
+    filtered_key_list_resource_factory
+)
+
+
+class AsyncResponse(object):
+    """A fully-read aiohttp response, shaped like a requests.Response."""
+
+    def __init__(self, status_code, headers, content, url):
+        super(AsyncResponse, self).__init__()
+
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    def __repr__(self):
+        return '<async-response [{0}]>'.format(self.status_code)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json_loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 500:
+            kind = 'Client'
+        elif 500 <= self.status_code < 600:
+            kind = 'Server'
+        else:
+            return
+
+        http_error = HTTPError('%s %s Error: %s' % (self.status_code, kind, self.url))
+        http_error.response = self
+        raise http_error
+
+
+class AsyncHerokuCore(object):
+    """The core asyncio Heroku class."""
+
+    def __init__(self, session=None, concurrency=100, limit_per_host=0, lazy=False):
+        super(AsyncHerokuCore, self).__init__()
+
+        #: The User's API Key.
+        self._api_key = None
+        self._api_key_verified = None
+        self._auth = None
+        self._heroku_url = HEROKU_URL
+        self._session = session
+        self._owns_session = session is None
+        self._limit_per_host = limit_per_host
+
+        #: Upper bound on in-flight requests.
+        self._concurrency = concurrency
+        self._semaphore = None
+
+        #: Hydrate model fields on first read, rather than up front.
+        self._lazy = lazy
+
+    def __repr__(self):
+        return '<async-heroku-core at 0x%x>' % (id(self))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Closes the underlying connection pool, if we created it."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # aiohttp sessions must be created inside the running loop.
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self._concurrency,
+                limit_per_host=self._limit_per_host
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Accept': 'application/json'}
+            )
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+
+        return self._session
+
+    async def authenticate(self, api_key):
+        """Logs user into Heroku with given api_key."""
+        self._api_key = api_key
+        self._auth = aiohttp.BasicAuth('', api_key)
+
+        return await self._verify_api_key()
+
+    async def request_key(self, username, password):
+        r = await self._http_resource(
+            method='POST',
+            resource=('login'),
+            data={'username': username, 'password': password}
+        )
+
+        return json_loads(r.content).get('api_key')
+
+    async def _verify_api_key(self):
+        r = await self._request('GET', self._url_for('apps'), auth=self._auth)
+
+        self._api_key_verified = True if r.ok else False
+
+        return self._api_key_verified
+
+    _url_for = HerokuCore._url_for
+    _url_for_resource = HerokuCore._url_for_resource
+    _resource_serialize = staticmethod(HerokuCore._resource_serialize)
+    _resource_deserialize = staticmethod(HerokuCore._resource_deserialize)
+
+    async def _request(self, method, url, params=None, data=None, auth=None):
+        session = self._get_session()
+
+        async with self._semaphore:
+            async with session.request(method, url, params=params, data=data, auth=auth) as resp:
+                content = await resp.read()
+
+        return AsyncResponse(resp.status, resp.headers, content, str(resp.url))
+
+    async def _http_resource(self, method, resource, params=None, data=None):
+        """Makes an HTTP request."""
+
+        url = self._url_for_resource(resource)
+        r = await self._request(method, url, params=params, data=data, auth=self._auth)
+
+        if r.status_code == 422:
+            http_error = HTTPError('%s Client Error: %s' %
+                                   (r.status_code, r.content.decode("utf-8")))
+            http_error.response = r
+            raise http_error
+
+        r.raise_for_status()
+
+        return r
+
+    async def _get_data(self, resource, params=None):
+        """Returns the deserialized body of a GET request."""
+        r = await self._http_resource('GET', resource, params=params)
+
+        return self._resource_deserialize(r.content)
+
+    async def _get_resource(self, resource, obj, params=None, **kwargs):
+        """Returns a mapped object from an HTTP resource."""
+        item = await self._get_data(resource, params=params)
+
+        return obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+
+    async def _get_resources(self, resource, obj, params=None, map=None, **kwargs):
+        """Returns a list of mapped objects from an HTTP resource."""
+        d_items = await self._get_data(resource, params=params)
+
+        items = [obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs) for item in d_items]
+
+        if map is None:
+            map = AsyncKeyedListResource
+
+        list_resource = map(items=items)
+        list_resource._h = self
+        list_resource._obj = obj
+        list_resource._kwargs = kwargs
+
+        return list_resource
+
+
+class AsyncHeroku(AsyncHerokuCore):
+    """The main asyncio Heroku class."""
+
+    def __init__(self, session=None, **kwargs):
+        super(AsyncHeroku, self).__init__(session=session, **kwargs)
+
+    def __repr__(self):
+        return '<async-heroku-client at 0x%x>' % (id(self))
+
+    @property
+    def account(self):
+        return self._get_resource(('account'), Account)
+
+    @property
+    def addons(self):
+        return self._get_resources(('addons'), AsyncAddon)
+
+    @property
+    def apps(self):
+        return self._get_resources(('apps'), AsyncApp)
+
+    @property
+    def keys(self):
+        return self._get_resources(('user', 'keys'), AsyncKey, map=AsyncSSHKeyListResource)
+
+    @property
+    def labs(self):
+        return self._get_resources(('features'), AsyncFeature, map=filtered_key_list_resource_factory(lambda obj: obj.kind == 'user'))
+
+
+async def from_key(api_key, **kwargs):
+    """Returns an authenticated AsyncHeroku instance, via API Key."""
+
+    h = AsyncHeroku(**kwargs)
+
+    # Login.
+    await h.authenticate(api_key)
+
+    return h
+
+
+class AsyncAddon(Addon):
+    """Heroku Addon, with awaitable methods."""
+
+    async def delete(self):
+        addon_name = self.attachment_name or self.name
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.app.name, 'addons', addon_name)
+        )
+        return r.ok
+
+    async def new(self, name, params=None):
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'addons', name),
+            params=params
+        )
+        return (await self.app.addons)[name]
+
+    async def upgrade(self, name, params=None):
+        """Upgrades an addon to the given tier."""
+        # Allow non-namespaced upgrades. (e.g. advanced vs logging:advanced)
+        if ':' not in name:
+            name = '{0}:{1}'.format(self.type, name)
+
+        await self._h._http_resource(
+            method='PUT',
+            resource=('apps', self.app.name, 'addons', quote(name)),
+            params=params,
+            data=' '   # Server weirdness.
+        )
+        return (await self.app.addons)[name]
+
+
+class AsyncApp(App):
+    """Heroku App, with awaitable methods."""
+
+    async def new(self, name=None, stack='cedar', region=None):
+        """Creates a new app."""
+
+        payload = {}
+
+        if name:
+            payload['app[name]'] = name
+
+        if stack:
+            payload['app[stack]'] = stack
+
+        if region:
+            payload['app[region]'] = region
+
+        r = await self._h._http_resource(
+            method='POST',
+            resource=('apps',),
+            data=payload
+        )
+
+        name = json_loads(r.content).get('name')
+        return (await self._h.apps).get(name)
+
+    @property
+    def addons(self):
+        return self._h._get_resources(
+            resource=('apps', self.name, 'addons'),
+            obj=AsyncAddon, app=self
+        )
+
+    @property
+    def collaborators(self):
+        """The collaborators for this app."""
+        return self._h._get_resources(
+            resource=('apps', self.name, 'collaborators'),
+            obj=AsyncCollaborator, app=self
+        )
+
+    @property
+    def domains(self):
+        """The domains for this app."""
+        return self._h._get_resources(
+            resource=('apps', self.name, 'domains'),
+            obj=AsyncDomain, app=self
+        )
+
+    @property
+    def releases(self):
+        """The releases for this app."""
+        return self._h._get_resources(
+            resource=('apps', self.name, 'releases'),
+            obj=AsyncRelease, app=self
+        )
+
+    @property
+    def processes(self):
+        """The proccesses for this app."""
+        return self._h._get_resources(
+            resource=('apps', self.name, 'ps'),
+            obj=AsyncProcess, app=self, map=AsyncProcessListResource
+        )
+
+    @property
+    def config(self):
+        """The envs for this app."""
+        return self._h._get_resource(
+            resource=('apps', self.name, 'config_vars'),
+            obj=AsyncConfigVars, app=self
+        )
+
+    @property
+    def info(self):
+        """Returns current info for this app."""
+        return self._h._get_resource(
+            resource=('apps', self.name),
+            obj=AsyncApp,
+        )
+
+    @property
+    def labs(self):
+        return self._h._get_resources(
+            resource=('features'),
+            obj=AsyncFeature, params={'app': self.name}, app=self, map=filtered_key_list_resource_factory(lambda item: item.kind == 'app')
+        )
+
+    def iter_releases(self):
+        raise TypeError('use `await app.releases` with AsyncHeroku')
+
+    def iter_processes(self):
+        raise TypeError('use `await app.processes` with AsyncHeroku')
+
+    def watch(self, *args, **kwargs):
+        raise TypeError('app.watch() is not supported with AsyncHeroku')
+
+    def log_stream(self, **kwargs):
+        raise TypeError('use `await app.logs(tail=True)` with AsyncHeroku')
+
+    async def rollback(self, release):
+        """Rolls back the release to the given version."""
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.name, 'releases'),
+            data={'rollback': release}
+        )
+        return (await self.releases)[-1]
+
+    async def rename(self, name):
+        """Renames app to given name."""
+        r = await self._h._http_resource(
+            method='PUT',
+            resource=('apps', self.name),
+            data={'app[name]': name}
+        )
+        return r.ok
+
+    async def transfer(self, user):
+        """Transfers app to given username's account."""
+        r = await self._h._http_resource(
+            method='PUT',
+            resource=('apps', self.name),
+            data={'app[transfer_owner]': user}
+        )
+        return r.ok
+
+    async def maintenance(self, on=True):
+        """Toggles maintenance mode."""
+        r = await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.name, 'server', 'maintenance'),
+            data={'maintenance_mode': int(on)}
+        )
+        return r.ok
+
+    async def scale_many(self, formation, wait=True, timeout=300, interval=1.0,
+                         max_interval=10.0):
+        """Scales several process types at once; see App.scale_many."""
+
+        started = time.time()
+
+        await asyncio.gather(*[self._scale(t, q) for (t, q) in formation.items()])
+
+        report = self._scale_report(formation)
+
+        if not wait:
+            return report
+
+        deadline = started + timeout
+        delay = interval
+
+        while True:
+            changed = self._converge(report, await self.processes, started)
+
+            now = time.time()
+            if all(entry['converged'] for entry in report.values()) or now >= deadline:
+                return report
+
+            delay = interval if changed else min(delay * 1.5, max_interval)
+            await asyncio.sleep(min(delay, deadline - now))
+
+    async def _scale(self, type, quantity):
+        return await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.name, 'ps', 'scale'),
+            data={'type': type, 'qty': quantity}
+        )
+
+    async def destroy(self):
+        """Destoys the app. Do be careful."""
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.name)
+        )
+        return r.ok
+
+    async def logs(self, num=None, source=None, ps=None, tail=False):
+        """Returns the requested log, or an async line iterator for tail."""
+
+        # Bootstrap payload package.
+        payload = {'logplex': 'true'}
+
+        if num:
+            payload['num'] = num
+
+        if source:
+            payload['source'] = source
+
+        if ps:
+            payload['ps'] = ps
+
+        if tail:
+            payload['tail'] = 1
+
+        # Grab the URL of the logplex endpoint.
+        r = await self._h._http_resource(
+            method='GET',
+            resource=('apps', self.name, 'logs'),
+            data=payload
+        )
+        url = r.content.decode("utf-8")
+
+        # Grab the actual logs (without our API credentials).
+        if not tail:
+            r = await self._h._request('GET', url)
+            return r.content
+
+        return _tail_lines(self._h._get_session(), url)
+
+
+async def _tail_lines(session, url):
+    async with session.get(url, ssl=False) as resp:
+        async for line in resp.content:
+            line = line.rstrip(b'\r\n')
+            if line:
+                yield line
+
+
+class AsyncCollaborator(Collaborator):
+    """Heroku Collaborator, with awaitable methods."""
+
+    async def new(self, email):
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'collaborators'),
+            data={'collaborator[email]': email}
+        )
+        return (await self.app.collaborators)[email]
+
+    async def delete(self):
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.app.name, 'collaborators', self.email)
+        )
+        return r.ok
+
+
+class AsyncConfigVars(ConfigVars):
+    """Heroku ConfigVars, with awaitable set and delete."""
+
+    def __setitem__(self, key, value):
+        raise TypeError('use `await config.set(key, value)` with AsyncHeroku')
+
+    def __delitem__(self, key):
+        raise TypeError('use `await config.delete(key)` with AsyncHeroku')
+
+    async def set(self, key, value):
+        return await self.update({key: value})
+
+    async def delete(self, key):
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.app.name, 'config_vars', key),
+        )
+        self.data.pop(key, None)
+        return r.ok
+
+    def batch(self):
+        raise TypeError('use `await config.update({...})` with AsyncHeroku')
+
+    async def update(self, *args, **kwargs):
+        """Sets several vars in a single PUT. None values delete a var."""
+        changes = dict(*args, **kwargs)
+
+        r = await self._h._http_resource(
+            method='PUT',
+            resource=('apps', self.app.name, 'config_vars'),
+            data=json_dumps(changes)
+        )
+
+        try:
+            data = r.json()
+        except ValueError:
+            data = None
+
+        if isinstance(data, dict):
+            self.data = data
+        else:
+            for (key, value) in changes.items():
+                if value is None:
+                    self.data.pop(key, None)
+                else:
+                    self.data[key] = value
+
+        return r.ok
+
+
+class AsyncDomain(Domain):
+    """Heroku Domain, with awaitable methods."""
+
+    async def delete(self):
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.app.name, 'domains', self.domain)
+        )
+        return r.ok
+
+    async def new(self, name):
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'domains'),
+            data={'domain_name[domain]': name}
+        )
+        return (await self.app.domains)[name]
+
+
+class AsyncKey(Key):
+    """Heroku SSH Key, with awaitable methods."""
+
+    async def new(self, key):
+        await self._h._http_resource(
+            method='POST',
+            resource=('user', 'keys'),
+            data=key
+        )
+        return (await self._h.keys).get(key.split()[-1])
+
+    async def delete(self):
+        """Deletes the key."""
+        await self._h._http_resource(
+            method='DELETE',
+            resource=('user', 'keys', self.id)
+        )
+
+
+class AsyncProcess(Process):
+    """Heroku Process, with awaitable methods."""
+
+    async def new(self, command, attach=""):
+        """Creates a new Process."""
+        r = await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'ps',),
+            data={'attach': attach, 'command': command}
+        )
+        return (await self.app.processes)[r.json()['process']]
+
+    async def restart(self, all=False):
+        """Restarts the given process."""
+        data = {'type': self.type} if all else {'ps': self.process}
+
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'ps', 'restart'),
+            data=data
+        )
+
+    async def stop(self, all=False):
+        """Stops the given process."""
+        data = {'type': self.type} if all else {'ps': self.process}
+
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'ps', 'stop'),
+            data=data
+        )
+
+    async def scale(self, quantity):
+        """Scales the given process to the given number of dynos."""
+        await self._h._http_resource(
+            method='POST',
+            resource=('apps', self.app.name, 'ps', 'scale'),
+            data={'type': self.type, 'qty': quantity}
+        )
+
+        try:
+            return (await self.app.processes)[self.type]
+        except KeyError:
+            return ProcessListResource()
+
+
+class AsyncRelease(Release):
+    """Heroku Release, with awaitable methods."""
+
+    async def rollback(self):
+        """Rolls back the application to this release."""
+        return await self.app.rollback(self.name)
+
+
+class AsyncFeature(Feature):
+    """Heroku Feature, with awaitable methods."""
+
+    async def enable(self):
+        r = await self._h._http_resource(
+            method='POST',
+            resource=('features', self.name),
+            params={'app': self.app.name if self.app else ''}
+        )
+        return r.ok
+
+    async def disable(self):
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('features', self.name),
+            params={'app': self.app.name if self.app else ''}
+        )
+        return r.ok
+
+
+class AsyncKeyedListResource(KeyedListResource):
+    """KeyedListResource, with an awaitable remove, and without the
+    blocking prefetch and del."""
+
+    def __delitem__(self, key):
+        raise TypeError('use `await items.remove(key)` or `await item.delete()` with AsyncHeroku')
+
+    async def remove(self, key):
+        if hasattr(self[0], 'delete'):
+            item = self[key]
+            r = await item.delete()
+            self._discard(item)
+
+            return r
+
+    def prefetch(self, *attrs, **kwargs):
+        raise TypeError('use `asyncio.gather(...)` over the items with AsyncHeroku')
+
+
+class AsyncProcessListResource(ProcessListResource):
+    """ProcessListResource, as AsyncKeyedListResource."""
+
+    __delitem__ = AsyncKeyedListResource.__delitem__
+    remove = AsyncKeyedListResource.remove
+    prefetch = AsyncKeyedListResource.prefetch
+
+
+class AsyncSSHKeyListResource(SSHKeyListResource):
+    """SSHKeyListResource with an awaitable clear, as
+    AsyncKeyedListResource."""
+
+    __delitem__ = AsyncKeyedListResource.__delitem__
+    remove = AsyncKeyedListResource.remove
+    prefetch = AsyncKeyedListResource.prefetch
+
+    async def clear(self):
+        """Removes all SSH keys from a user's system."""
+        r = await self._h._http_resource(
+            method='DELETE',
+            resource=('user', 'keys'),
+        )
+        return r.ok
@@ -7,36 +7,155 @@ heroku.api
 This module provides the basic API interface for Heroku.
 """
 
-from .compat import json
-from .helpers import is_collection
+from .cache import ResponseCache, SingleFlight
+from .compat import json_dumps, json_loads
+from .helpers import is_collection, iter_json_array, release_version
+from .instrumentation import Metrics, RequestEvent, route_template
 from .models import *
 from .structures import KeyedListResource
+from .throttle import RateLimiter
 from heroku.models import Feature
+from contextlib import contextmanager
+from threading import Lock
+import logging
+import time
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 import requests
 
 HEROKU_URL = 'https://api.heroku.com'
 
+logger = logging.getLogger(__name__)
+
+#: Bytes read from the socket at a time, when streaming responses.
+STREAM_CHUNK_SIZE = 16 * 1024
+
 
 class HerokuCore(object):
     """The core Heroku class."""
-    def __init__(self, session=None):
+    def __init__(self, session=None, cache=None, lazy=False, page_size=None,
+                 read_ahead=False, pool_connections=None, pool_maxsize=None,
+                 pool_block=False, keep_alive=True, timeout=None,
+                 rate_limit=None, coalesce=False, metrics=None,
+                 incremental_releases=False):
         super(HerokuCore, self).__init__()
         if session is None:
             session = requests.session()
 
+        # Size the connection pools, if asked to.
+        if pool_connections is not None or pool_maxsize is not None:
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections or 10,
+                pool_maxsize=pool_maxsize or 10,
+                pool_block=pool_block
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+
+        if cache is True:
+            cache = ResponseCache()
+
+        if rate_limit is True:
+            rate_limit = RateLimiter()
+
         #: The User's API Key.
         self._api_key = None
         self._api_key_verified = None
         self._heroku_url = HEROKU_URL
         self._session = session
 
+        #: Optional conditional-request cache for GETs.
+        self._cache = cache
+
+        #: Hydrate model fields on first read, rather than up front.
+        self._lazy = lazy
+
+        #: Fetch collections in Range-header pages of this many items.
+        self._page_size = page_size
+
+        #: Fetch the next page in the background while one is consumed.
+        self._read_ahead = read_ahead
+
+        #: Per-request timeout, in seconds (or a (connect, read) tuple).
+        self._timeout = timeout
+
+        #: Optional token bucket shared by every request on this instance.
+        self._rate_limiter = rate_limit
+
+        #: Shares one in-flight GET between concurrent identical calls.
+        self._flights = SingleFlight() if coalesce else None
+
+        #: {app name: release history}, when only new releases are fetched.
+        self._releases = {} if incremental_releases else None
+        self._releases_lock = Lock()
+
+        #: Callables given a RequestEvent before and after each request.
+        self.hooks = {'pre_request': [], 'post_request': []}
+
+        if metrics is True:
+            metrics = Metrics()
+
+        #: The in-memory metrics aggregator, if one was asked for.
+        self.metrics = metrics
+
+        if metrics is not None:
+            self.register_hook('post_request', metrics)
+
         # We only want JSON back.
         self._session.headers.update({'Accept': 'application/json'})
 
     def __repr__(self):
         return '<heroku-core at 0x%x>' % (id(self))
 
+    @property
+    def rate_limit_stats(self):
+        """Tokens, waits and retries of the rate limiter, if there is one."""
+        if self._rate_limiter is not None:
+            return self._rate_limiter.stats
+
+    def register_hook(self, event, hook):
+        """Registers a callable for 'pre_request' or 'post_request'.
+
+        Hooks are called with a RequestEvent, on the requesting thread.
+        Exceptions raised by a hook are logged, and don't affect the
+        request or the other hooks.
+        """
+        if event not in self.hooks:
+            raise ValueError('Unknown hook event: {0!r}'.format(event))
+
+        self.hooks[event].append(hook)
+
+    def _fire(self, name, event):
+        for hook in self.hooks[name]:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception('%s hook %r failed', name, hook)
+
+    @contextmanager
+    def _instrumented(self, method, resource):
+        """Yields a RequestEvent, and fires the hooks around it.
+
+        Yields None when no hooks are registered.
+        """
+        if not (self.hooks['pre_request'] or self.hooks['post_request']):
+            yield None
+            return
+
+        event = RequestEvent(method, route_template(resource), self._url_for(*resource))
+        self._fire('pre_request', event)
+
+        try:
+            yield event
+        except Exception as why:
+            event.error = why
+            raise
+        finally:
+            self._fire('post_request', event)
+
     def authenticate(self, api_key):
         """Logs user into Heroku with given api_key."""
         self._api_key = api_key
@@ -54,7 +173,7 @@ class HerokuCore(object):
         )
         r.raise_for_status()
 
-        return json.loads(r.content.decode("utf-8")).get('api_key')
+        return json_loads(r.content).get('api_key')
 
     @property
     def is_authenticated(self):
@@ -64,7 +183,7 @@ class HerokuCore(object):
             return self._api_key_verified
 
     def _verify_api_key(self):
-        r = self._session.get(self._url_for('apps'))
+        r = self._session.get(self._url_for('apps'), timeout=self._timeout)
 
         self._api_key_verified = True if r.ok else False
 
@@ -74,28 +193,100 @@ class HerokuCore(object):
         args = map(str, args)
         return '/'.join([self._heroku_url] + list(args))
 
+    def _url_for_resource(self, resource):
+        if not is_collection(resource):
+            resource = [resource]
+
+        return self._url_for(*resource)
+
     @staticmethod
     def _resource_serialize(o):
-        """Returns JSON serialization of given object."""
-        return json.dumps(o)
+        """Returns JSON serialization (UTF-8 bytes) of given object."""
+        return json_dumps(o)
 
     @staticmethod
     def _resource_deserialize(s):
-        """Returns dict deserialization of a given JSON string."""
+        """Returns dict deserialization of a given JSON body (bytes or str)."""
 
         try:
-            return json.loads(s)
+            return json_loads(s)
         except ValueError:
             raise ResponseError('The API Response was not valid.')
 
-    def _http_resource(self, method, resource, params=None, data=None):
-        """Makes an HTTP request."""
+    def _http_resource(self, method, resource, params=None, data=None,
+                       headers=None, stream=False, event=None):
+        """Makes an HTTP request.
+
+        Fills in the given RequestEvent; without one, the request is
+        instrumented on its own.
+        """
 
         if not is_collection(resource):
             resource = [resource]
 
+        if event is not None:
+            return self._request(method, resource, params, data, headers, stream, event)
+
+        with self._instrumented(method, resource) as event:
+            return self._request(method, resource, params, data, headers, stream, event)
+
+    def _request(self, method, resource, params, data, headers, stream, event):
         url = self._url_for(*resource)
-        r = self._session.request(method, url, params=params, data=data)
+
+        # Revalidate cached GETs, rather than downloading them again.
+        cache_key = None
+        entry = None
+
+        if self._cache is not None and method == 'GET' and not stream:
+            cache_key = self._cache.key(method, url, params, headers)
+            entry = self._cache.get(cache_key)
+
+            if entry is not None:
+                headers = dict(headers or {})
+                headers.update(entry.validators())
+
+        limiter = self._rate_limiter
+        attempt = 0
+
+        if event is not None:
+            started = time.time()
+
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+
+            r = self._session.request(method, url, params=params, data=data,
+                                      headers=headers, stream=stream,
+                                      timeout=self._timeout)
+
+            if limiter is None:
+                break
+
+            limiter.update(r)
+
+            # Only GETs are safe to repeat.
+            if (method != 'GET' or r.status_code not in (429, 503) or
+                    attempt >= limiter.max_retries):
+                break
+
+            r.close()
+            time.sleep(limiter.retry_delay(attempt, r))
+            attempt += 1
+
+        if event is not None:
+            # Before a 304 is swapped for the cached response.
+            event.network = time.time() - started
+            event.status = r.status_code
+            event.bytes_out = len(r.request.body or b'') if r.request else 0
+
+            if stream:
+                event.bytes_in = int(r.headers.get('Content-Length') or 0) or None
+            else:
+                event.bytes_in = len(r.content or b'')
+
+        if entry is not None and r.status_code == 304:
+            self._cache.touch(cache_key)
+            return entry.response
 
         if r.status_code == 422:
             http_error = HTTPError('%s Client Error: %s' %
@@ -105,21 +296,163 @@ class HerokuCore(object):
 
         r.raise_for_status()
 
+        if cache_key is not None:
+            self._cache.set(cache_key, r)
+        elif self._cache is not None and method not in ('GET', 'HEAD'):
+            self._invalidate(resource)
+
         return r
 
+    def _grow_pool(self, size):
+        """Makes room for size pooled connections to the API, so that as
+        many concurrent requests don't open connections the pool then
+        discards. Never shrinks the pool."""
+
+        adapter = self._session.get_adapter(self._heroku_url)
+
+        if not isinstance(adapter, HTTPAdapter) or adapter._pool_maxsize >= size:
+            return
+
+        # The (most specific) prefix the adapter was resolved by.
+        prefix = [prefix for (prefix, mounted) in self._session.adapters.items()
+                  if mounted is adapter and self._heroku_url.lower().startswith(prefix.lower())][0]
+
+        grown = HTTPAdapter(
+            pool_connections=adapter._pool_connections,
+            pool_maxsize=size,
+            max_retries=adapter.max_retries,
+            pool_block=adapter._pool_block
+        )
+        self._session.mount(prefix, grown)
+        adapter.close()
+
+    def _get_url(self, url, stream=False):
+        """GETs an absolute, non-API URL through the pooled session.
+
+        The request is sent without the session's API credentials, but
+        with the environment's settings (e.g. HTTPS_PROXY).
+        """
+        request = requests.Request('GET', url).prepare()
+        settings = self._session.merge_environment_settings(url, {}, stream, False, None)
+
+        return self._session.send(request, timeout=self._timeout, **settings)
+
+    def _invalidate(self, resource):
+        """Drops cached responses a write to the given resource may affect."""
+
+        # e.g. a write to apps/foo/addons drops apps/foo/* and apps.
+        self._cache.invalidate(self._url_for(*resource[:2]))
+
+        if len(resource) > 1:
+            self._cache.invalidate(self._url_for(resource[0]), prefix=False)
+
+    def _fetch(self, resource, params=None, headers=None, event=None):
+        """Returns a GET response, and its deserialized body.
+
+        With coalescing on, concurrent identical GETs share one request,
+        and every caller receives the same (read-only) body.
+        """
+        if self._flights is None:
+            return self._fetch_once(resource, params, headers, event)
+
+        key = ResponseCache.key('GET', self._url_for_resource(resource), params, headers)
+        r, data = self._flights.do(key, self._fetch_once, resource, params, headers, event)
+
+        # Answered by another caller's request: no network time of our own.
+        if event is not None and event.status is None:
+            event.status = r.status_code
+
+        return r, data
+
+    def _fetch_once(self, resource, params=None, headers=None, event=None):
+        r = self._http_resource('GET', resource, params=params, headers=headers, event=event)
+
+        entry = None
+        if self._cache is not None:
+            key = self._cache.key('GET', self._url_for_resource(resource), params, headers)
+            entry = self._cache.get(key)
+
+        if entry is None or entry.response is not r:
+            return r, self._decode(r, event)
+
+        # Cache hit; decode once and share the (read-only) result.
+        if entry.data is None:
+            entry.data = self._decode(r, event)
+
+        return r, entry.data
+
+    def _decode(self, r, event=None):
+        """Deserializes a response body, timing it into the event."""
+        if event is None:
+            return self._resource_deserialize(r.content)
+
+        started = time.time()
+        try:
+            return self._resource_deserialize(r.content)
+        finally:
+            event.decode = time.time() - started
+
+    def _get_data(self, resource, params=None):
+        """Returns the deserialized body of a GET request."""
+        return self._fetch(resource, params=params)[1]
+
+    def _resource_from_response(self, r, obj, key=None, **kwargs):
+        """Returns a mapped object from a write's response body.
+
+        Returns None unless the body is a JSON object carrying the given
+        key (by default, the object's first primary key).
+        """
+        if key is None:
+            key = obj._pks[0]
+
+        try:
+            item = self._resource_deserialize(r.content)
+        except (ResponseError, UnicodeDecodeError):
+            return None
+
+        if not isinstance(item, dict) or key not in item:
+            return None
+
+        return obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+
     def _get_resource(self, resource, obj, params=None, **kwargs):
         """Returns a mapped object from an HTTP resource."""
-        r = self._http_resource('GET', resource, params=params)
-        item = self._resource_deserialize(r.content.decode("utf-8"))
 
-        return obj.new_from_dict(item, h=self, **kwargs)
+        if not is_collection(resource):
+            resource = [resource]
+
+        with self._instrumented('GET', resource) as event:
+            item = self._fetch(resource, params=params, event=event)[1]
+
+            if event is None:
+                return obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+
+            started = time.time()
+            item = obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+            event.hydrate = time.time() - started
+
+            return item
 
     def _get_resources(self, resource, obj, params=None, map=None, **kwargs):
         """Returns a list of mapped objects from an HTTP resource."""
-        r = self._http_resource('GET', resource, params=params)
-        d_items = self._resource_deserialize(r.content.decode("utf-8"))
 
-        items =  [obj.new_from_dict(item, h=self, **kwargs) for item in d_items]
+        if not is_collection(resource):
+            resource = [resource]
+
+        if self._page_size:
+            # Pages are fetched (and instrumented) as the list is consumed.
+            items = self._iter_pages(resource, obj, params=params, **kwargs)
+        else:
+            with self._instrumented('GET', resource) as event:
+                d_items = self._fetch(resource, params=params, event=event)[1]
+
+                if event is not None:
+                    started = time.time()
+
+                items =  [obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs) for item in d_items]
+
+                if event is not None:
+                    event.hydrate = time.time() - started
 
         if map is None:
             map = KeyedListResource
@@ -128,15 +461,121 @@ class HerokuCore(object):
         list_resource._h = self
         list_resource._obj = obj
         list_resource._kwargs = kwargs
+        list_resource._fetched_at = time.time()
 
         return list_resource
 
+    def _iter_pages(self, resource, obj, params=None, **kwargs):
+        """Yields mapped objects from a resource, one Range page at a time.
+
+        Follows ``Next-Range`` for as long as the API answers with a 206.
+        """
+
+        page = '{0} ..; max={1}'.format(
+            obj._pks[0] if obj._pks else 'id', self._page_size)
+
+        pool = pending = None
+
+        if self._read_ahead:
+            from concurrent.futures import ThreadPoolExecutor
+            pool = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            while page is not None:
+                if pending is not None:
+                    r, d_items = pending.result()
+                else:
+                    r, d_items = self._fetch(resource, params=params, headers={'Range': page})
+
+                page = r.headers.get('Next-Range') if r.status_code == 206 else None
+
+                if pool is not None and page is not None:
+                    pending = pool.submit(self._fetch, resource, params, {'Range': page})
+                else:
+                    pending = None
+
+                for item in d_items:
+                    yield obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False)
+
+    def _sync_releases(self, app):
+        """Returns the app's release history, fetching only the releases
+        newer than the ones already held."""
+
+        resource = ('apps', app.name, 'releases')
+
+        with self._releases_lock:
+            held = self._releases.get(app.name)
+
+        if held is None:
+            held = self._get_resources(resource, Release, app=app)
+
+            with self._releases_lock:
+                return self._releases.setdefault(app.name, held)
+
+        latest = max([release_version(release.name) for release in held] or [0])
+        page = 'name ]v{0}..'.format(latest)
+        items = []
+
+        while page is not None:
+            r, d_items = self._fetch(resource, headers={'Range': page})
+            page = r.headers.get('Next-Range') if r.status_code == 206 else None
+
+            # Without Range support, the whole list comes back.
+            items.extend(d for d in d_items if release_version(d.get('name')) > latest)
+
+        items.sort(key=lambda d: release_version(d.get('name')))
+
+        with self._releases_lock:
+            for item in items:
+                if held.get(item.get('name')) is None:
+                    held._append(Release.new_from_dict(item, h=self, lazy=self._lazy, app=app))
+
+            held._fetched_at = time.time()
+
+        return held
+
+    def _add_release(self, app, release):
+        """Adds a just-created release to the app's held history."""
+
+        with self._releases_lock:
+            held = self._releases.get(app.name)
+
+            if held is not None and held.get(release.name) is None:
+                held._append(release)
+
+    def _iter_resources(self, resource, obj, params=None, **kwargs):
+        """Yields mapped objects from an HTTP resource, as they are parsed.
+
+        The response body is decoded incrementally from the socket, so
+        memory use doesn't grow with the size of the collection.
+        """
+        r = self._http_resource('GET', resource, params=params, stream=True)
+
+        try:
+            for item in iter_json_array(r.iter_content(STREAM_CHUNK_SIZE)):
+                yield obj.new_from_dict(item, h=self, lazy=self._lazy, **kwargs)
+        except ValueError:
+            raise ResponseError('The API Response was not valid.')
+        finally:
+            r.close()
+
 
 class Heroku(HerokuCore):
     """The main Heroku class."""
 
-    def __init__(self, session=None):
-        super(Heroku, self).__init__(session=session)
+    def __init__(self, session=None, **kwargs):
+        super(Heroku, self).__init__(session=session, **kwargs)
+
+        #: The apps of the last load_snapshot.
+        self._snapshot = None
+
+        #: The background refresh started by the last load_snapshot.
+        self.snapshot_refresh = None
+
+        self._watcher = None
 
     def __repr__(self):
         return '<heroku-client at 0x%x>' % (id(self))
@@ -161,6 +600,99 @@ class Heroku(HerokuCore):
     def labs(self):
         return self._get_resources(('features'), Feature, map=filtered_key_list_resource_factory(lambda obj: obj.kind == 'user'))
 
+    @property
+    def watcher(self):
+        """The Watcher polling this instance's watched apps."""
+        if self._watcher is None:
+            from .watch import Watcher
+            self._watcher = Watcher(self)
+
+        return self._watcher
+
+    def save_snapshot(self, path, apps=None):
+        """Saves apps, with each app's prefetched sub-resources, to an
+        SQLite file at path.
+
+        ``apps`` defaults to those of the last load_snapshot, or else to
+        a fresh ``self.apps``. Prefetched config vars are saved too, so
+        the file is created readable by its owner only (0600). Returns
+        the number of collections saved.
+        """
+        from .snapshot import save
+
+        if apps is None:
+            apps = self._snapshot if self._snapshot is not None else self.apps
+
+        return save(path, apps)
+
+    def load_snapshot(self, path, max_age=None, refresh=True, workers=8):
+        """Returns the apps saved at path, with their sub-resources
+        attached, without making any requests::
+
+            apps = h.load_snapshot('heroku.db', max_age=600)
+
+        Collections fetched more than ``max_age`` seconds before are
+        refetched in the background (unless ``refresh`` is False), and
+        swapped in as they arrive; see ``snapshot_refresh``.
+        """
+        from .snapshot import Refresh, load
+
+        apps, stale = load(self, path, max_age)
+
+        self._snapshot = apps
+        self.snapshot_refresh = None
+
+        if stale and refresh:
+            self.snapshot_refresh = Refresh(self, apps, stale, workers=workers).start()
+
+        return apps
+
+    def scale_many(self, formations, workers=16, **kwargs):
+        """Scales the formations of many apps at once.
+
+        :param formations: ``{app or app name: {type: quantity}}``.
+        :param workers: Apps scaled (and waited on) concurrently.
+
+        Other arguments are passed to App.scale_many. Returns ``{app
+        name: report}``, with the exception in place of the report for
+        any app that failed.
+        """
+
+        apps = None
+        reports = {}
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+
+            for (app, formation) in formations.items():
+                if not isinstance(app, App):
+                    apps = apps if apps is not None else self.apps
+
+                    try:
+                        app = apps[app]
+                    except KeyError as why:
+                        reports[app] = why
+                        continue
+
+                futures[app.name] = pool.submit(app.scale_many, formation, **kwargs)
+
+            for (name, future) in futures.items():
+                try:
+                    reports[name] = future.result()
+                except Exception as why:
+                    reports[name] = why
+
+        return reports
+
+    def iter_addons(self):
+        """Yields addons one at a time, as they are streamed in."""
+        return self._iter_resources(('addons'), Addon)
+
+    def iter_apps(self):
+        """Yields apps one at a time, as they are streamed in."""
+        return self._iter_resources(('apps'), App)
 
 
 class ResponseError(ValueError):
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.cache
+~~~~~~~~~~~~
+
+This module contains the conditional-request response cache, and the
+single-flight coalescing of identical in-flight requests.
+"""
+
+from collections import OrderedDict
+from threading import Event, Lock, RLock
+import time
+
+
+class CacheEntry(object):
+    """A cached GET response, along with its validators."""
+
+    def __init__(self, response):
+        super(CacheEntry, self).__init__()
+
+        self.response = response
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.size = len(response.content or b'')
+        self.stored_at = time.time()
+
+        #: The decoded body, shared by every hit on this entry.
+        self.data = None
+
+    def validators(self):
+        """Returns the conditional headers for revalidating this entry."""
+
+        headers = {}
+
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+
+class ResponseCache(object):
+    """An LRU cache of GET responses, bounded by count, bytes and age.
+
+    Entries are always revalidated with ``If-None-Match`` /
+    ``If-Modified-Since``; a ``304 Not Modified`` reuses the stored body.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024, ttl=300):
+        super(ResponseCache, self).__init__()
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = RLock()
+
+    def __repr__(self):
+        return '<response-cache entries={0} bytes={1}>'.format(len(self), self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(method, url, params=None, headers=None):
+        """Returns the cache key for a request."""
+
+        if params:
+            params = tuple(sorted((str(k), str(v)) for (k, v) in params.items()))
+
+        # Each page of a ranged collection is cached separately.
+        page = headers.get('Range') if headers else None
+
+        return (method.upper(), url, params or (), page)
+
+    def get(self, key):
+        """Returns the live entry for the given key, or None."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if self.ttl is not None and (time.time() - entry.stored_at) > self.ttl:
+                self._discard(key)
+                return None
+
+            # Mark as most recently used.
+            self._entries.pop(key)
+            self._entries[key] = entry
+
+            return entry
+
+    def set(self, key, response):
+        """Stores a response, if it carries any validators."""
+
+        entry = CacheEntry(response)
+
+        if not (entry.etag or entry.last_modified):
+            return None
+
+        if self.max_bytes is not None and entry.size > self.max_bytes:
+            return None
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+        return entry
+
+    def touch(self, key):
+        """Restarts the TTL of an entry that was just revalidated."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.time()
+
+    def invalidate(self, url, prefix=True):
+        """Drops every entry for the given URL, and (by default) below it."""
+
+        with self._lock:
+            for key in [k for k in self._entries
+                        if k[1] == url or (prefix and k[1].startswith(url + '/'))]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._entries))
+            self._discard(key)
+
+
+class _Flight(object):
+    """A call in progress, and its outcome."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls with the same key into a single call.
+
+    The first caller runs the function; callers arriving while it is in
+    flight wait for, and share, its result (or exception).
+    """
+
+    def __init__(self):
+        super(SingleFlight, self).__init__()
+
+        self._flights = {}
+        self._lock = Lock()
+
+        #: Calls answered by another caller's request.
+        self.shared = 0
+
+    def __repr__(self):
+        return '<single-flight in-flight={0} shared={1}>'.format(len(self._flights), self.shared)
+
+    def do(self, key, func, *args):
+        """Returns func(*args), sharing the call with concurrent callers."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        try:
+            flight.result = func(*args)
+        except Exception as why:
+            flight.error = why
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+            flight.done.set()
+
+        return flight.result
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.columns
+~~~~~~~~~~~~~~
+
+This module contains the columnar (struct-of-arrays) export behind
+KeyedListResource.to_columns.
+"""
+
+from array import array
+from calendar import timegm
+from datetime import datetime
+
+from .compat import import_numpy
+
+# array('q') is Python 3 only.
+try:
+    INT_TYPECODE = array('q').typecode
+except ValueError:
+    INT_TYPECODE = 'l'
+
+#: NumPy's NaT, as an int64.
+NAT = -(2 ** 63)
+
+
+class Categorical(object):
+    """A dictionary-encoded column: codes into a list of categories.
+
+    A code of -1 marks a missing (None) value.
+    """
+
+    def __init__(self, codes, categories):
+        super(Categorical, self).__init__()
+
+        self.codes = codes
+        self.categories = categories
+
+    def __repr__(self):
+        return '<categorical {0} values, {1} categories>'.format(len(self), len(self.categories))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return self.categories[code] if code >= 0 else None
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def counts(self, weights=None):
+        """Returns ``{category: count}``, or the sum of weights (another
+        column of the same length) per category."""
+
+        numpy = import_numpy()
+        n = len(self.categories)
+
+        if numpy is not None and isinstance(self.codes, numpy.ndarray):
+            present = self.codes >= 0
+            codes = self.codes[present]
+
+            if weights is not None:
+                weights = numpy.asarray(weights)[present]
+
+            totals = numpy.bincount(codes, weights=weights, minlength=n)
+
+            # bincount always sums weights as floats.
+            if weights is None or weights.dtype.kind in 'biu':
+                totals = totals.astype(numpy.int64)
+
+            totals = totals.tolist()
+        else:
+            totals = [0] * n
+
+            for (i, code) in enumerate(self.codes):
+                if code >= 0:
+                    totals[code] += 1 if weights is None else weights[i]
+
+        return dict(zip(self.categories, totals))
+
+
+def _timestamp(value):
+    """Returns microseconds since the epoch (naive datetimes are UTC)."""
+    return timegm(value.utctimetuple()) * 1000000 + value.microsecond
+
+
+def _categorical(values, numpy):
+    codes = []
+    categories = []
+    seen = {}
+
+    for value in values:
+        if value is None:
+            codes.append(-1)
+            continue
+
+        code = seen.get(value)
+
+        if code is None:
+            code = seen[value] = len(categories)
+            categories.append(value)
+
+        codes.append(code)
+
+    if numpy is not None:
+        return Categorical(numpy.array(codes, dtype=numpy.int32), categories)
+
+    return Categorical(array('i', codes), categories)
+
+
+def column(model, field, values, numpy=None):
+    """Returns a column of values, typed by the model's declaration of
+    the field; undeclared fields are dictionary-encoded."""
+
+    if field in model._ints:
+        # No int stands in for a missing value, so those columns are
+        # floats, with NaN where missing.
+        if None in values:
+            values = [float('nan') if v is None else float(v) for v in values]
+
+            if numpy is not None:
+                return numpy.array(values, dtype=numpy.float64)
+
+            return array('d', values)
+
+        values = [int(v) for v in values]
+
+        if numpy is not None:
+            return numpy.array(values, dtype=numpy.int64)
+
+        return array(INT_TYPECODE, values)
+
+    if field in model._bools:
+        values = [bool(v) for v in values]
+
+        if numpy is not None:
+            return numpy.array(values, dtype=numpy.bool_)
+
+        return array('b', values)
+
+    if field in model._dates:
+        values = [_timestamp(v) if isinstance(v, datetime) else None for v in values]
+
+        if numpy is not None:
+            values = [NAT if v is None else v for v in values]
+            return numpy.array(values, dtype=numpy.int64).view('datetime64[us]')
+
+        # Seconds since the epoch; NaN where missing.
+        return array('d', [float('nan') if v is None else v / 1e6 for v in values])
+
+    return _categorical(values, numpy)
+
+
+def to_columns(items, model, fields=None, use_numpy=None):
+    """Returns ``{field: column}`` for the given items.
+
+    :param fields: Defaults to the model's str, int, date and bool fields.
+    :param use_numpy: Build NumPy arrays; by default, when it's installed.
+    """
+
+    if fields is None:
+        fields = model._strs + model._ints + model._dates + model._bools
+
+    numpy = import_numpy() if use_numpy or use_numpy is None else None
+
+    if use_numpy and numpy is None:
+        raise ImportError('NumPy is not installed.')
+
+    return dict(
+        (field, column(model, field, [getattr(item, field, None) for item in items], numpy))
+        for field in fields
+    )
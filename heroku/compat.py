@@ -7,7 +7,126 @@ heroku.compat
 Compatiblity for heroku.py.
 """
 
+import sys
+
 try:
     import json
 except ImportError:
-    import simplejson as json
\ No newline at end of file
+    import simplejson as json
+
+
+def with_metaclass(meta, *bases):
+    """Returns a base class with the given metaclass, on Python 2 and 3."""
+
+    return meta('with_metaclass_base', bases, {})
+
+
+class JSONBackend(object):
+    """A JSON implementation: ``loads`` takes bytes or text, ``dumps``
+    returns UTF-8 bytes."""
+
+    def __init__(self, name, loads, dumps):
+        super(JSONBackend, self).__init__()
+
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '<json-backend {0!r}>'.format(self.name)
+
+
+def _orjson():
+    import orjson
+    return JSONBackend('orjson', orjson.loads, orjson.dumps)
+
+
+def _ujson():
+    import ujson
+    return JSONBackend('ujson', ujson.loads, lambda o: ujson.dumps(o).encode('utf-8'))
+
+
+def _simplejson():
+    import simplejson
+    return JSONBackend('simplejson', simplejson.loads, lambda o: simplejson.dumps(o).encode('utf-8'))
+
+
+def _stdlib():
+    if sys.version_info >= (3, 6):
+        loads = json.loads
+    else:
+        loads = lambda s: json.loads(s.decode('utf-8') if isinstance(s, bytes) else s)
+
+    return JSONBackend('json', loads, lambda o: json.dumps(o).encode('utf-8'))
+
+
+#: JSON backends, fastest first.
+JSON_BACKENDS = (
+    ('orjson', _orjson),
+    ('ujson', _ujson),
+    ('simplejson', _simplejson),
+    ('json', _stdlib),
+)
+
+_json_backend = None
+
+
+def get_json_backend():
+    """Returns the JSON backend in use, picking the fastest installed one
+    on first use."""
+
+    global _json_backend
+
+    if _json_backend is None:
+        set_json_backend(None)
+
+    return _json_backend
+
+
+def set_json_backend(backend):
+    """Sets the JSON backend by name (e.g. ``'ujson'``), or to a
+    JSONBackend. None picks the fastest one installed."""
+
+    global _json_backend
+
+    if isinstance(backend, JSONBackend):
+        _json_backend = backend
+        return backend
+
+    factories = dict(JSON_BACKENDS)
+
+    if backend is not None:
+        if backend not in factories:
+            raise ValueError('Unknown JSON backend: {0!r}'.format(backend))
+
+        _json_backend = factories[backend]()
+        return _json_backend
+
+    for (name, factory) in JSON_BACKENDS:
+        try:
+            _json_backend = factory()
+        except ImportError:
+            continue
+
+        return _json_backend
+
+
+def json_loads(s):
+    """Deserializes JSON from bytes (or text), with the current backend."""
+    return (_json_backend or get_json_backend()).loads(s)
+
+
+def json_dumps(o):
+    """Serializes to UTF-8 JSON bytes, with the current backend."""
+    return (_json_backend or get_json_backend()).dumps(o)
+
+
+def import_numpy():
+    """Returns numpy, or None when it isn't installed."""
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
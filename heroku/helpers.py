@@ -7,14 +7,71 @@ heroku.helpers
 This module contians the helpers.
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from dateutil.parser import parse as parse_datetime
+from .compat import json
 
+import codecs
+import re
 import sys
 
 if sys.version_info > (3, 0):
     basestring = (str, bytes)
+    intern = sys.intern
+
+try:
+    from datetime import timezone
+except ImportError:
+    timezone = None
+
+# e.g. 2012/01/01 10:00:00 -0000, as emitted by the legacy API.
+LEGACY_DATE_RE = re.compile(
+    r'^(\d{4})/(\d{2})/(\d{2}) (\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2}):?(\d{2})$'
+)
+
+_fromisoformat = getattr(datetime, 'fromisoformat', None)
+_timezones = {}
+
+
+def _timezone(sign, hours, minutes):
+    offset = (int(hours) * 60 + int(minutes)) * (-1 if sign == '-' else 1)
+
+    try:
+        return _timezones[offset]
+    except KeyError:
+        tz = timezone.utc if offset == 0 else timezone(timedelta(minutes=offset))
+        _timezones[offset] = tz
+
+        return tz
+
+
+def parse_datetime(value):
+    """Parses an API timestamp, falling back to dateutil for unknown formats."""
+
+    if isinstance(value, str) and timezone is not None:
+        m = LEGACY_DATE_RE.match(value)
+
+        if m is not None:
+            g = m.groups()
+            return datetime(
+                int(g[0]), int(g[1]), int(g[2]), int(g[3]), int(g[4]), int(g[5]),
+                tzinfo=_timezone(g[6], g[7], g[8])
+            )
+
+        if _fromisoformat is not None:
+            # fromisoformat only accepts a 'Z' suffix from Python 3.11.
+            if value[-1:] == 'Z':
+                value = value[:-1] + '+00:00'
+
+            try:
+                return _fromisoformat(value)
+            except ValueError:
+                pass
+
+    # Imported here: dateutil is slow to import, and rarely needed.
+    from dateutil.parser import parse
+
+    return parse(value)
 
 def is_collection(obj):
     """Tests if an object is a collection."""
@@ -28,6 +85,93 @@ def is_collection(obj):
     return val
 
 
+def release_version(name):
+    """Returns the number of a release name, e.g. 12 for 'v12' (or -1)."""
+
+    try:
+        return int(str(name).lstrip('v'))
+    except ValueError:
+        return -1
+
+
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+# What may follow an item of an array.
+SCALAR_END = ',] \t\n\r'
+
+
+def iter_json_array(chunks):
+    """Yields the items of a JSON array, decoding them as chunks arrive.
+
+    :param chunks: Iterable of UTF-8 encoded bytes.
+    """
+
+    decode = json.JSONDecoder().raw_decode
+    text = codecs.getincrementaldecoder('utf-8')()
+
+    chunks = iter(chunks)
+    buf, pos = '', 0
+    expect = '['
+    eof = False
+
+    while True:
+        while True:
+            pos = WHITESPACE_RE.match(buf, pos).end()
+
+            if pos == len(buf):
+                break
+
+            if expect == '[':
+                if buf[pos] != '[':
+                    raise ValueError('Expected a JSON array.')
+
+                pos += 1
+                expect = 'first'
+
+            elif expect == ',':
+                if buf[pos] == ']':
+                    return
+
+                if buf[pos] != ',':
+                    raise ValueError('Expected , or ] at char {0}.'.format(pos))
+
+                pos += 1
+                expect = 'item'
+
+            else:
+                if expect == 'first' and buf[pos] == ']':
+                    return
+
+                try:
+                    item, end = decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    break
+
+                # A number or literal may go on in the next chunk (e.g.
+                # '2.' then '5'); wait until a delimiter follows it.
+                if (not eof and buf[pos] not in '{["' and
+                        (end == len(buf) or buf[end] not in SCALAR_END)):
+                    break
+
+                yield item
+
+                pos = end
+                expect = ','
+
+        if eof:
+            raise ValueError('Unexpected end of JSON array.')
+
+        try:
+            chunk = text.decode(next(chunks))
+        except StopIteration:
+            chunk = text.decode(b'', final=True)
+            eof = True
+
+        buf, pos = buf[pos:] + chunk, 0
+
 
 # from kennethreitz/python-github3
 def to_python(obj,
@@ -38,6 +182,7 @@ def to_python(obj,
     object_map=None,
     bool_keys=None,
     dict_keys=None,
+    intern_keys=None,
     **kwargs):
     """Extends a given object for API Consumption.
 
@@ -46,6 +191,7 @@ def to_python(obj,
     :param string_keys: List of in_dict keys that will be extracted as strings.
     :param date_keys: List of in_dict keys that will be extrad as datetimes.
     :param object_map: Dict of {key, obj} map, for nested object results.
+    :param intern_keys: List of string keys whose values will be interned.
     """
 
     d = dict()
@@ -54,6 +200,11 @@ def to_python(obj,
         for in_key in str_keys:
             d[in_key] = in_dict.get(in_key)
 
+    if intern_keys:
+        for in_key in intern_keys:
+            if isinstance(d.get(in_key), str):
+                d[in_key] = intern(d[in_key])
+
     if date_keys:
         for in_key in date_keys:
             in_date = in_dict.get(in_key)
@@ -85,8 +236,11 @@ def to_python(obj,
             if in_dict.get(k):
                 d[k] = v.new_from_dict(in_dict.get(k))
 
-    obj.__dict__.update(d)
-    obj.__dict__.update(kwargs)
+    for (k, v) in d.items():
+        setattr(obj, k, v)
+
+    for (k, v) in kwargs.items():
+        setattr(obj, k, v)
 
     # Save the dictionary, for write comparisons.
     # obj._cache = d
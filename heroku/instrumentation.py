@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.instrumentation
+~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the per-request instrumentation events and the
+built-in in-memory metrics aggregator.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+
+# Collection names, and the placeholder for the member that follows them.
+ROUTE_PARAMS = {
+    'addons': '{addon}',
+    'apps': '{app}',
+    'collaborators': '{collaborator}',
+    'config_vars': '{key}',
+    'domains': '{domain}',
+    'features': '{feature}',
+    'keys': '{key}',
+    'releases': '{release}',
+}
+
+#: Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf')
+)
+
+
+def route_template(resource):
+    """Returns the templated path of a resource, e.g. ``apps/{app}/ps``."""
+
+    route = []
+    param = None
+
+    for segment in resource:
+        if param is not None:
+            route.append(param)
+            param = None
+        else:
+            segment = str(segment)
+            route.append(segment)
+            param = ROUTE_PARAMS.get(segment)
+
+    return '/'.join(route)
+
+
+class RequestEvent(object):
+    """What happened during a single API request.
+
+    Durations are in seconds; ``decode`` and ``hydrate`` are only set
+    for requests that return models.
+    """
+
+    __slots__ = (
+        'method', 'route', 'url', 'status', 'bytes_in', 'bytes_out',
+        'network', 'decode', 'hydrate', 'error'
+    )
+
+    def __init__(self, method, route, url):
+        self.method = method
+        self.route = route
+        self.url = url
+        self.status = None
+        self.bytes_in = None
+        self.bytes_out = 0
+        self.network = None
+        self.decode = None
+        self.hydrate = None
+        self.error = None
+
+    def __repr__(self):
+        return '<request-event {0} {1} [{2}]>'.format(self.method, self.route, self.status)
+
+
+class RouteStats(object):
+    """Counts and latency histogram of one method and route."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.network = 0.0
+        self.decode = 0.0
+        self.hydrate = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+    def dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'statuses': dict(self.statuses),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'network': self.network,
+            'decode': self.decode,
+            'hydrate': self.hydrate,
+            'histogram': dict(zip(LATENCY_BUCKETS, self.histogram)),
+        }
+
+
+class Metrics(object):
+    """An in-memory aggregator of RequestEvents, per method and route.
+
+    Register it as a post_request hook::
+
+        metrics = Metrics()
+        h.register_hook('post_request', metrics)
+    """
+
+    def __init__(self):
+        super(Metrics, self).__init__()
+
+        self._routes = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<metrics routes={0}>'.format(len(self._routes))
+
+    def __call__(self, event):
+        key = (event.method, event.route)
+
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = RouteStats()
+
+            stats.count += 1
+            stats.statuses[event.status] = stats.statuses.get(event.status, 0) + 1
+            stats.bytes_in += event.bytes_in or 0
+            stats.bytes_out += event.bytes_out or 0
+
+            if event.error is not None:
+                stats.errors += 1
+
+            if event.network is not None:
+                stats.network += event.network
+                stats.histogram[bisect_left(LATENCY_BUCKETS, event.network)] += 1
+
+            if event.decode is not None:
+                stats.decode += event.decode
+
+            if event.hydrate is not None:
+                stats.hydrate += event.hydrate
+
+    def snapshot(self):
+        """Returns ``{(method, route): stats dict}`` of everything so far."""
+        with self._lock:
+            return dict((key, stats.dict()) for (key, stats) in self._routes.items())
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
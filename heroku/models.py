@@ -7,11 +7,13 @@ heroku.models
 This module contains the models that comprise the Heroku API.
 """
 
+from .compat import json_dumps, json_loads, with_metaclass
 from .helpers import to_python
+from .streams import LogStream
 from .structures import *
-import json
-import requests
+from functools import wraps
 import sys
+import time
 
 if sys.version_info > (3, 0):
     from urllib.parse import quote
@@ -19,7 +21,70 @@ else:
     from urllib import quote
 
 
-class BaseResource(object):
+def prefetchable(func):
+    """Marks a sub-resource property as one that can be prefetched."""
+
+    name = func.__name__
+
+    @wraps(func)
+    def fget(self):
+        if self._prefetched and name in self._prefetched:
+            return self._prefetched[name]
+
+        return func(self)
+
+    fget.fetch = func
+
+    return property(fget)
+
+
+class ResourceMeta(type):
+    """Gives each model slot-backed storage for its declared fields."""
+
+    def __new__(mcs, name, bases, attrs):
+
+        if '__slots__' not in attrs:
+            def declared(attr, default):
+                if attr in attrs:
+                    return attrs[attr]
+
+                for base in bases:
+                    if hasattr(base, attr):
+                        return getattr(base, attr)
+
+                return default
+
+            keys = (
+                declared('_strs', []) + declared('_ints', []) +
+                declared('_dates', []) + declared('_bools', []) +
+                list(declared('_map', {}).keys())
+            )
+            fields = keys + declared('_dicts', [])
+
+            # Read by _bootstrap on every hydration.
+            attrs['_key_names'] = tuple(keys)
+
+            taken = set(attrs)
+            for base in bases:
+                for klass in base.__mro__:
+                    taken.update(getattr(klass, '__slots__', ()))
+
+            slots = []
+            for field in fields:
+                if field not in taken:
+                    slots.append(field)
+                    taken.add(field)
+
+            attrs['__slots__'] = tuple(slots)
+
+        return super(ResourceMeta, mcs).__new__(mcs, name, bases, attrs)
+
+
+class BaseResource(with_metaclass(ResourceMeta, object)):
+
+    # Fields get their own slots (see ResourceMeta); anything else, such
+    # as extra new_from_dict kwargs, overflows into __dict__.
+    __slots__ = ('_h', 'app', '_raw', '_prefetched', '__dict__')
 
     _strs = []
     _ints = []
@@ -29,22 +94,71 @@ class BaseResource(object):
     _map = {}
     _pks = []
 
+    #: Low-cardinality string fields, interned to share storage.
+    _interned = []
+
+    #: The fields set up by _bootstrap, generated by ResourceMeta.
+    _key_names = ()
+
     def __init__(self):
         self._bootstrap()
         self._h = None
+
+        #: Sub-resources held in memory by KeyedListResource.prefetch.
+        self._prefetched = None
+
         super(BaseResource, self).__init__()
 
     def __repr__(self):
         return "<resource '{0}'>".format(self._id)
 
+    def __getattr__(self, name):
+        # Only reached for unset attributes, i.e. not-yet-hydrated fields.
+        if name not in self._fields() or getattr(self, '_raw', None) is None:
+            raise AttributeError(
+                "'{0}' object has no attribute '{1}'".format(type(self).__name__, name))
+
+        self._hydrate(name)
+
+        return object.__getattribute__(self, name)
+
     def _bootstrap(self):
         """Bootstraps the model object based on configured values."""
 
-        for attr in self._keys():
-            setattr(self, attr, None)
+        # Fields present in a lazy object's raw dict are hydrated on read.
+        raw = getattr(self, '_raw', None) or {}
+
+        for attr in self._key_names:
+            if attr not in raw:
+                setattr(self, attr, None)
+
+    def _hydrate(self, name):
+        """Converts a single field from the raw dict, and memoizes it."""
+
+        keys = [name]
+
+        to_python(
+            obj=self,
+            in_dict=self._raw,
+            str_keys=keys if name in self._strs else None,
+            int_keys=keys if name in self._ints else None,
+            date_keys=keys if name in self._dates else None,
+            bool_keys=keys if name in self._bools else None,
+            dict_keys=keys if name in self._dicts else None,
+            object_map={name: self._map[name]} if name in self._map else None,
+            intern_keys=self._interned
+        )
+
+        try:
+            object.__getattribute__(self, name)
+        except AttributeError:
+            setattr(self, name, None)
 
     def _keys(self):
-        return self._strs + self._ints + self._dates + self._bools + list(self._map.keys())
+        return list(self._key_names)
+
+    def _fields(self):
+        return self._keys() + self._dicts
 
     @property
     def _id(self):
@@ -66,19 +180,90 @@ class BaseResource(object):
             except ValueError:
                 pass
 
+    def _fetch(self, attr):
+        """Fetches a prefetchable sub-resource from the API."""
+        return getattr(type(self), attr).fget.fetch(self)
+
+    def _attach(self, attr, value):
+        """Serves future reads of the given sub-resource from memory."""
+        if self._prefetched is None:
+            self._prefetched = {}
+
+        self._prefetched[attr] = value
+
+    def _expire(self, *attrs):
+        """Drops prefetched sub-resources, so they are fetched again."""
+        if self._prefetched:
+            for attr in attrs:
+                self._prefetched.pop(attr, None)
+
+    def _created(self, attr, item, key, replaces=None):
+        """Returns an item just created under the given sub-resource.
+
+        ``item`` is hydrated from the write's response; it is patched
+        into a prefetched list in place. When the response didn't carry
+        the item (``None``), the sub-resource is refetched instead, and
+        the item is looked up in it by key; without a key to look up,
+        the sub-resource is only expired, and None is returned.
+        """
+        if item is None:
+            self._expire(attr)
+
+            return None if key is None else getattr(self, attr)[key]
+
+        held = self._prefetched.get(attr) if self._prefetched else None
+
+        if held is not None:
+            if replaces is not None:
+                held._discard(replaces)
+
+            if item not in held._items:
+                held._append(item)
+
+        return item
+
+    def _removed(self, attr, item):
+        """Drops a just-deleted item from a prefetched sub-resource list."""
+        held = self._prefetched.get(attr) if self._prefetched else None
+
+        if held is not None:
+            held._discard(item)
+
 
     def dict(self):
         d = dict()
-        for k in self.keys():
-            d[k] = self.__dict__.get(k)
+        for k in self._keys():
+            d[k] = getattr(self, k, None)
 
         return d
 
     @classmethod
-    def new_from_dict(cls, d, h=None, **kwargs):
+    def new_from_dict(cls, d, h=None, lazy=False, **kwargs):
+        """Returns a model hydrated from the given API dict.
+
+        With ``lazy=True`` the dict is kept as-is, and each field is
+        converted when it is first read.
+        """
+
+        if lazy:
+            obj = cls.__new__(cls)
+            obj._raw = d
+            obj.__init__()
+            obj._h = h
+
+            for (k, v) in kwargs.items():
+                setattr(obj, k, v)
+
+            return obj
+
+        # Set before __init__, so _bootstrap doesn't miss the slot and
+        # go through __getattr__.
+        obj = cls.__new__(cls)
+        obj._raw = None
+        obj.__init__()
 
         d = to_python(
-            obj=cls(),
+            obj=obj,
             in_dict=d,
             str_keys=cls._strs,
             int_keys=cls._ints,
@@ -86,10 +271,12 @@ class BaseResource(object):
             bool_keys=cls._bools,
             dict_keys= cls._dicts,
             object_map=cls._map,
+            intern_keys=cls._interned,
             _h = h
         )
 
-        d.__dict__.update(kwargs)
+        for (k, v) in kwargs.items():
+            setattr(d, k, v)
 
         return d
 
@@ -111,6 +298,7 @@ class AvailableAddon(BaseResource):
     _strs = ['name', 'description', 'url', 'state']
     _bools = ['beta',]
     _pks = ['name']
+    _interned = ['state']
 
     def __repr__(self):
         return "<available-addon '{0}'>".format(self.name)
@@ -139,6 +327,7 @@ class Addon(AvailableAddon):
             method='DELETE',
             resource=('apps', self.app.name, 'addons', addon_name)
         )
+        self.app._removed('addons', self)
         return r.ok
 
     def new(self, name, params=None):
@@ -148,7 +337,9 @@ class Addon(AvailableAddon):
             params=params
         )
         r.raise_for_status()
-        return self.app.addons[name]
+
+        addon = self._h._resource_from_response(r, type(self), app=self.app)
+        return self.app._created('addons', addon, name)
 
     def upgrade(self, name, params=None):
         """Upgrades an addon to the given tier."""
@@ -163,7 +354,9 @@ class Addon(AvailableAddon):
             data=' '   # Server weirdness.
         )
         r.raise_for_status()
-        return self.app.addons[name]
+
+        addon = self._h._resource_from_response(r, type(self), app=self.app)
+        return self.app._created('addons', addon, name, replaces=self)
 
 
 class App(BaseResource):
@@ -173,6 +366,7 @@ class App(BaseResource):
     _ints = ['id', 'slug_size', 'repo_size', 'dynos', 'workers']
     _dates = ['created_at',]
     _pks = ['name', 'id']
+    _interned = ['create_status', 'stack', 'repo_migrate_status']
 
     def __init__(self):
         super(App, self).__init__()
@@ -200,17 +394,22 @@ class App(BaseResource):
             data=payload
         )
 
-        name = json.loads(r.content).get('name')
-        return self._h.apps.get(name)
+        app = self._h._resource_from_response(r, type(self))
 
-    @property
+        if app is None:
+            name = json_loads(r.content).get('name')
+            app = self._h.apps.get(name)
+
+        return app
+
+    @prefetchable
     def addons(self):
         return self._h._get_resources(
             resource=('apps', self.name, 'addons'),
             obj=Addon, app=self
         )
 
-    @property
+    @prefetchable
     def collaborators(self):
         """The collaborators for this app."""
         return self._h._get_resources(
@@ -218,7 +417,7 @@ class App(BaseResource):
             obj=Collaborator, app=self
         )
 
-    @property
+    @prefetchable
     def domains(self):
         """The domains for this app."""
         return self._h._get_resources(
@@ -226,15 +425,22 @@ class App(BaseResource):
             obj=Domain, app=self
         )
 
-    @property
+    @prefetchable
     def releases(self):
-        """The releases for this app."""
+        """The releases for this app.
+
+        With ``Heroku(incremental_releases=True)``, the history is kept,
+        and only releases newer than it are fetched.
+        """
+        if self._h._releases is not None:
+            return self._h._sync_releases(self)
+
         return self._h._get_resources(
             resource=('apps', self.name, 'releases'),
             obj=Release, app=self
         )
 
-    @property
+    @prefetchable
     def processes(self):
         """The proccesses for this app."""
         return self._h._get_resources(
@@ -242,7 +448,21 @@ class App(BaseResource):
             obj=Process, app=self, map=ProcessListResource
         )
 
-    @property
+    def iter_releases(self):
+        """Yields releases one at a time, as they are streamed in."""
+        return self._h._iter_resources(
+            resource=('apps', self.name, 'releases'),
+            obj=Release, app=self
+        )
+
+    def iter_processes(self):
+        """Yields processes one at a time, as they are streamed in."""
+        return self._h._iter_resources(
+            resource=('apps', self.name, 'ps'),
+            obj=Process, app=self
+        )
+
+    @prefetchable
     def config(self):
         """The envs for this app."""
 
@@ -260,13 +480,25 @@ class App(BaseResource):
             obj=App,
         )
 
-    @property
+    @prefetchable
     def labs(self):
         return self._h._get_resources(
             resource=('features'),
             obj=Feature, params={'app': self.name}, app=self, map=filtered_key_list_resource_factory(lambda item: item.kind == 'app')
         )
 
+    def watch(self, attrs=('processes', 'releases', 'config'), callback=None, **kwargs):
+        """Watches this app for changes, e.g.::
+
+            for event in app.watch(['processes']):
+                if isinstance(event, ProcessStateChanged):
+                    ...
+
+        Events are passed to ``callback`` if given, else queued on the
+        returned Watch. See heroku.watch.Watcher.
+        """
+        return self._h.watcher.watch(self, attrs, callback=callback, **kwargs)
+
     def rollback(self, release):
         """Rolls back the release to the given version."""
         r = self._h._http_resource(
@@ -274,7 +506,14 @@ class App(BaseResource):
             resource=('apps', self.name, 'releases'),
             data={'rollback': release}
         )
-        return self.releases[-1]
+        self._expire('config')
+
+        release = self._h._resource_from_response(r, Release, app=self)
+
+        if release is not None and self._h._releases is not None:
+            self._h._add_release(self, release)
+
+        return self._created('releases', release, -1)
 
 
     def rename(self, name):
@@ -307,6 +546,90 @@ class App(BaseResource):
         )
         return r.ok
 
+    def scale_many(self, formation, wait=True, timeout=300, interval=1.0,
+                   max_interval=10.0):
+        """Scales several process types at once, e.g. {'web': 10, 'worker': 4}.
+
+        The scale calls are issued concurrently. With ``wait``, the
+        processes are then polled (faster while counts are changing,
+        backing off while they aren't) until every type has exactly the
+        requested number of processes ``up``, or ``timeout`` seconds pass.
+
+        Returns a report of ``{type: {'requested', 'up', 'converged',
+        'elapsed'}}``, where ``elapsed`` is the seconds each type took
+        to converge.
+        """
+
+        started = time.time()
+
+        if formation:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=len(formation)) as pool:
+                for future in [pool.submit(self._scale, t, q) for (t, q) in formation.items()]:
+                    future.result()
+
+        report = self._scale_report(formation)
+
+        if not wait:
+            return report
+
+        deadline = started + timeout
+        delay = interval
+
+        while True:
+            changed = self._converge(report, self.processes, started)
+
+            now = time.time()
+            if all(entry['converged'] for entry in report.values()) or now >= deadline:
+                return report
+
+            delay = interval if changed else min(delay * 1.5, max_interval)
+            time.sleep(min(delay, deadline - now))
+
+    @staticmethod
+    def _scale_report(formation):
+        report = {}
+        for (type, quantity) in formation.items():
+            report[type] = {'requested': quantity, 'up': None, 'converged': False, 'elapsed': None}
+
+        return report
+
+    @staticmethod
+    def _converge(report, processes, started):
+        """Updates a scale_many report from the current processes;
+        returns whether any 'up' count changed."""
+
+        up, running = {}, {}
+        for process in processes:
+            running[process.type] = running.get(process.type, 0) + 1
+            if process.state == 'up':
+                up[process.type] = up.get(process.type, 0) + 1
+
+        changed = False
+        for (type, entry) in report.items():
+            if entry['up'] != up.get(type, 0):
+                entry['up'] = up.get(type, 0)
+                changed = True
+
+            if not entry['converged'] and entry['up'] == running.get(type, 0) == entry['requested']:
+                entry['converged'] = True
+                entry['elapsed'] = time.time() - started
+
+        return changed
+
+    def _scale(self, type, quantity):
+        r = self._h._http_resource(
+            method='POST',
+            resource=('apps', self.name, 'ps', 'scale'),
+            data={'type': type, 'qty': quantity}
+        )
+
+        r.raise_for_status()
+        self._expire('processes')
+
+        return r
+
     def destroy(self):
         """Destoys the app. Do be careful."""
 
@@ -319,6 +642,25 @@ class App(BaseResource):
     def logs(self, num=None, source=None, ps=None, tail=False):
         """Returns the requested log."""
 
+        r = self._logs_response(num=num, source=source, ps=ps, tail=tail)
+
+        if not tail:
+            return r.content
+        else:
+            # Return line iterator for tail!
+            return r.iter_lines()
+
+    def log_stream(self, **kwargs):
+        """Returns a reconnecting, buffered LogStream tailing this app's logs.
+
+        See :class:`heroku.streams.LogStream` for the available options.
+        """
+
+        return LogStream(self, **kwargs).start()
+
+    def _logs_response(self, num=None, source=None, ps=None, tail=False):
+        """Returns the (streaming) logplex response for the requested log."""
+
         # Bootstrap payload package.
         payload = {'logplex': 'true'}
 
@@ -341,14 +683,8 @@ class App(BaseResource):
             data=payload
         )
 
-        # Grab the actual logs.
-        r = requests.get(r.content.decode("utf-8"), verify=False, stream=True)
-
-        if not tail:
-            return r.content
-        else:
-            # Return line iterator for tail!
-            return r.iter_lines()
+        # Grab the actual logs, over a pooled connection.
+        return self._h._get_url(r.content.decode("utf-8"), stream=True)
 
 
 
@@ -357,6 +693,7 @@ class Collaborator(BaseResource):
 
     _strs = ['access', 'email']
     _pks = ['email']
+    _interned = ['access']
 
     def __init__(self):
         self.app = None
@@ -372,13 +709,15 @@ class Collaborator(BaseResource):
             data={'collaborator[email]': email}
         )
 
-        return self.app.collaborators[email]
+        collaborator = self._h._resource_from_response(r, type(self), app=self.app)
+        return self.app._created('collaborators', collaborator, email)
 
     def delete(self):
         r = self._h._http_resource(
             method='DELETE',
             resource=('apps', self.app.name, 'collaborators', self.email)
         )
+        self.app._removed('collaborators', self)
 
         return r.ok
 
@@ -398,8 +737,39 @@ class ConfigVars(object):
         return repr(self.data)
 
     def __setitem__(self, key, value):
+        return self._put({key: value})
+
+    def __delitem__(self, key):
+        r = self._h._http_resource(
+            method='DELETE',
+            resource=('apps', self.app.name, 'config_vars', key),
+        )
+        self.data.pop(key, None)
+        self._expire()
+
+        return r.ok
+
+    def update(self, *args, **kwargs):
+        """Sets several vars in a single PUT. None values delete a var."""
+        return self._put(dict(*args, **kwargs))
+
+    def batch(self):
+        """Returns a context manager collecting sets and deletes::
+
+            with app.config.batch() as c:
+                c['RACK_ENV'] = 'production'
+                del c['DEBUG']
+
+        The changes are sent as one PUT when the block exits cleanly.
+        """
+        return ConfigVarsBatch(self)
+
+    def _put(self, changes):
+        if not changes:
+            return True
+
         # API expects JSON.
-        payload = json.dumps({key: value})
+        payload = json_dumps(changes)
 
         r = self._h._http_resource(
             method='PUT',
@@ -407,27 +777,87 @@ class ConfigVars(object):
             data=payload
         )
 
-        return r.ok
+        # The API answers with the resulting vars; apply them locally.
+        try:
+            data = json_loads(r.content)
+        except ValueError:
+            data = None
 
-    def __delitem__(self, key):
-        r = self._h._http_resource(
-            method='DELETE',
-            resource=('apps', self.app.name, 'config_vars', key),
-        )
+        if isinstance(data, dict):
+            self.data = data
+        else:
+            for (key, value) in changes.items():
+                if value is None:
+                    self.data.pop(key, None)
+                else:
+                    self.data[key] = value
+
+        self._expire()
 
         return r.ok
 
+    def _expire(self):
+        # Another prefetched copy of these vars is now out of date.
+        prefetched = self.app._prefetched or {}
+
+        if prefetched.get('config') is not self:
+            self.app._expire('config')
+
     @classmethod
     def new_from_dict(cls, d, h=None, **kwargs):
         # Override normal operation because of crazy api.
         c = cls()
-        c.data = d
+        c.data = dict(d)
         c._h = h
         c.app = kwargs.get('app')
 
         return c
 
 
+class ConfigVarsBatch(object):
+    """Pending changes to ConfigVars, sent together by flush()."""
+
+    def __init__(self, config):
+        self.config = config
+        self.changes = {}
+
+        super(ConfigVarsBatch, self).__init__()
+
+    def __repr__(self):
+        return '<config-batch {0!r}>'.format(self.changes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            if self.changes[key] is None:
+                raise KeyError(key)
+
+            return self.changes[key]
+
+        return self.config.data[key]
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        self.changes[key] = None
+
+    def update(self, *args, **kwargs):
+        self.changes.update(*args, **kwargs)
+
+    def flush(self):
+        """Sends the pending changes as a single PUT."""
+        changes, self.changes = self.changes, {}
+
+        return self.config._put(changes)
+
+
 class Domain(BaseResource):
     """Heroku Domain."""
 
@@ -449,6 +879,7 @@ class Domain(BaseResource):
             method='DELETE',
             resource=('apps', self.app.name, 'domains', self.domain)
         )
+        self.app._removed('domains', self)
 
         return r.ok
 
@@ -459,7 +890,8 @@ class Domain(BaseResource):
             data={'domain_name[domain]': name}
         )
 
-        return self.app.domains[name]
+        domain = self._h._resource_from_response(r, type(self), app=self.app)
+        return self.app._created('domains', domain, name)
 
 
 class Key(BaseResource):
@@ -487,7 +919,12 @@ class Key(BaseResource):
             data=key
         )
 
-        return self._h.keys.get(key.split()[-1])
+        new_key = self._h._resource_from_response(r, type(self), key='contents')
+
+        if new_key is None:
+            new_key = self._h.keys.get(key.split()[-1])
+
+        return new_key
 
     def delete(self):
         """Deletes the key."""
@@ -516,6 +953,7 @@ class Process(BaseResource):
     _bools = ['attached']
     _dates = []
     _pks = ['process', 'upid']
+    _interned = ['app_name', 'slug', 'action', 'state']
 
 
     def __init__(self):
@@ -530,6 +968,9 @@ class Process(BaseResource):
         Creates a new Process
         Attach: If attach=True it will return a rendezvous connection point, for streaming stdout/stderr
         Command: The actual command it will run
+
+        Returns the new Process, or None when the response doesn't name
+        it (the app's processes are then fetched again on their next read).
         """
         r = self._h._http_resource(
             method='POST',
@@ -538,7 +979,9 @@ class Process(BaseResource):
         )
 
         r.raise_for_status()
-        return self.app.processes[r.json()['process']]
+
+        process = self._h._resource_from_response(r, type(self), app=self.app)
+        return self.app._created('processes', process, None)
 
     @property
     def type(self):
@@ -560,6 +1003,7 @@ class Process(BaseResource):
         )
 
         r.raise_for_status()
+        self.app._expire('processes')
 
     def stop(self, all=False):
         """Stops the given process."""
@@ -577,17 +1021,12 @@ class Process(BaseResource):
         )
 
         r.raise_for_status()
+        self.app._expire('processes')
 
     def scale(self, quantity):
         """Scales the given process to the given number of dynos."""
 
-        r = self._h._http_resource(
-            method='POST',
-            resource=('apps', self.app.name, 'ps', 'scale'),
-            data={'type': self.type, 'qty': quantity}
-        )
-
-        r.raise_for_status()
+        self.app._scale(self.type, quantity)
 
         try:
             return self.app.processes[self.type]
@@ -625,6 +1064,7 @@ class Feature(BaseResource):
     _strs = ['name', 'kind', 'summary', 'docs',]
     _bools = ['enabled']
     _pks = ['name']
+    _interned = ['kind']
 
     def __init__(self):
         self.app = None
@@ -639,6 +1079,8 @@ class Feature(BaseResource):
             resource=('features', self.name),
             params={'app': self.app.name if self.app else ''}
         )
+        if self.app:
+            self.app._expire('labs')
         return r.ok
 
     def disable(self):
@@ -647,4 +1089,6 @@ class Feature(BaseResource):
             resource=('features', self.name),
             params={'app': self.app.name if self.app else ''}
         )
+        if self.app:
+            self.app._expire('labs')
         return r.ok
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.snapshot
+~~~~~~~~~~~~~~~
+
+This module contains the on-disk (SQLite) snapshots of apps and their
+prefetched sub-resources, used by Heroku.save_snapshot/load_snapshot.
+"""
+
+from datetime import datetime
+from threading import Event, Thread
+import os
+import sqlite3
+import time
+
+from . import models, structures
+from .compat import json_dumps, json_loads
+
+#: Bumped whenever the stored layout changes; other versions aren't loaded.
+VERSION = 1
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    # One row per collection; owner is '' for the apps list itself.
+    'CREATE TABLE IF NOT EXISTS collections ('
+    ' owner TEXT NOT NULL, attr TEXT NOT NULL, model TEXT NOT NULL,'
+    ' container TEXT, fetched_at REAL NOT NULL, body BLOB NOT NULL,'
+    ' PRIMARY KEY (owner, attr))',
+)
+
+
+def dump(item):
+    """Returns the API dict of a hydrated model."""
+
+    raw = getattr(item, '_raw', None)
+    if raw is not None:
+        return raw
+
+    d = {}
+
+    for k in item._fields():
+        v = getattr(item, k, None)
+
+        if isinstance(v, datetime):
+            v = v.isoformat()
+        elif isinstance(v, models.BaseResource):
+            v = dump(v)
+
+        d[k] = v
+
+    return d
+
+
+def _row(owner, attr, value, now):
+    fetched_at = getattr(value, '_fetched_at', None) or now
+
+    if isinstance(value, models.ConfigVars):
+        return (owner, attr, 'ConfigVars', None, fetched_at, json_dumps(value.data))
+
+    container = type(value).__name__
+    model = value._obj.__name__ if value._obj is not None else None
+
+    # Only lists of models we can find again by name.
+    if getattr(structures, container, None) is None or getattr(models, model or '', None) is None:
+        return None
+
+    body = json_dumps([dump(item) for item in value._items])
+
+    return (owner, attr, model, container, fetched_at, body)
+
+
+def save(path, apps):
+    """Writes the apps, and their prefetched sub-resources, to path.
+
+    The file is readable by its owner only: prefetched config vars hold
+    credentials. Returns the number of collections written.
+    """
+
+    now = time.time()
+    rows = [_row('', 'apps', apps, now)]
+
+    for app in apps:
+        for (attr, value) in sorted((app._prefetched or {}).items()):
+            rows.append(_row(app.name, attr, value, now))
+
+    rows = [row for row in rows if row is not None]
+
+    # Created (or narrowed) to 0600 before anything is written to it.
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+
+    db = sqlite3.connect(path)
+
+    try:
+        with db:
+            for statement in SCHEMA:
+                db.execute(statement)
+
+            db.execute('DELETE FROM collections')
+            db.executemany('INSERT INTO collections VALUES (?, ?, ?, ?, ?, ?)',
+                           [row[:5] + (sqlite3.Binary(row[5]),) for row in rows])
+            db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                           [('version', str(VERSION)), ('saved_at', repr(now))])
+    finally:
+        db.close()
+
+    return len(rows)
+
+
+def _build(h, model, container, fetched_at, body, app=None):
+    data = json_loads(body)
+    kwargs = {'app': app} if app is not None else {}
+
+    if container is None:
+        value = getattr(models, model).new_from_dict(data, h=h, **kwargs)
+    else:
+        obj = getattr(models, model)
+        items = [obj.new_from_dict(d, h=h, lazy=h._lazy, **kwargs) for d in data]
+
+        value = getattr(structures, container)(items=items)
+        value._h = h
+        value._obj = obj
+        value._kwargs = kwargs
+
+    value._fetched_at = fetched_at
+
+    return value
+
+
+def load(h, path, max_age=None):
+    """Rebuilds the apps saved at path, without any requests.
+
+    Returns the apps, and a list of the stale ``(app name, attr)``
+    collections (``('', 'apps')`` for the apps list itself), i.e. those
+    fetched more than max_age seconds ago.
+    """
+
+    # Connecting would create an empty database.
+    if not os.path.exists(path):
+        raise IOError('No snapshot at {0}'.format(path))
+
+    db = sqlite3.connect(path)
+
+    try:
+        version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+
+        if version is None or int(version[0]) != VERSION:
+            raise ValueError('Unsupported snapshot version: {0}'.format(version and version[0]))
+
+        rows = db.execute(
+            'SELECT owner, attr, model, container, fetched_at, body FROM collections'
+        ).fetchall()
+    except sqlite3.DatabaseError as why:
+        raise ValueError('Not a snapshot: {0}'.format(why))
+    finally:
+        db.close()
+
+    collections = {}
+    for (owner, attr, model, container, fetched_at, body) in rows:
+        collections[(owner, attr)] = (model, container, fetched_at, body)
+
+    if ('', 'apps') not in collections:
+        raise ValueError('The snapshot has no apps.')
+
+    apps = _build(h, *collections.pop(('', 'apps')))
+    stale = []
+    now = time.time()
+
+    if max_age is not None and now - apps._fetched_at > max_age:
+        stale.append(('', 'apps'))
+
+    for ((owner, attr), (model, container, fetched_at, body)) in sorted(collections.items()):
+        app = apps.get(owner)
+
+        if app is None:
+            continue
+
+        app._attach(attr, _build(h, model, container, fetched_at, body, app=app))
+
+        if max_age is not None and now - fetched_at > max_age:
+            stale.append((owner, attr))
+
+    return apps, stale
+
+
+class Refresh(object):
+    """Refetches the stale collections of a loaded snapshot, in the
+    background, replacing each one as its fresh copy arrives."""
+
+    def __init__(self, h, apps, stale, workers=8):
+        super(Refresh, self).__init__()
+
+        self.apps = apps
+        self.stale = stale
+        self.workers = workers
+
+        #: {(app name, attr): exception} of the refreshes that failed.
+        self.errors = {}
+
+        self._h = h
+        self._done = Event()
+        self._thread = None
+
+    def __repr__(self):
+        return '<snapshot-refresh stale={0} done={1}>'.format(len(self.stale), self.done)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='heroku-snapshot-refresh')
+            self._thread.daemon = True
+            self._thread.start()
+
+        return self
+
+    def wait(self, timeout=None):
+        """Waits for the refresh to finish; returns whether it has."""
+        return self._done.wait(timeout)
+
+    def _run(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        try:
+            # The apps first, so sub-resources attach to the current apps.
+            if ('', 'apps') in self.stale:
+                try:
+                    self._merge(self._h.apps)
+                except Exception as why:
+                    self.errors[('', 'apps')] = why
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for key in self.stale:
+                    if key != ('', 'apps'):
+                        pool.submit(self._refresh, *key)
+        finally:
+            self._done.set()
+
+    def _merge(self, fresh):
+        """Updates the loaded apps in place from a fresh apps list."""
+
+        apps = self.apps
+        names = set()
+
+        for app in fresh:
+            names.add(app.name)
+            held = apps.get(app.name)
+
+            if held is None:
+                apps._append(app)
+                continue
+
+            for k in app._fields():
+                setattr(held, k, getattr(app, k))
+
+            held._raw = None
+
+        # Field values changed under the secondary indexes.
+        apps._indexes = {}
+
+        for app in [app for app in apps if app.name not in names]:
+            apps._discard(app)
+
+        apps._fetched_at = fresh._fetched_at
+
+    def _refresh(self, name, attr):
+        app = self.apps.get(name)
+
+        if app is None:
+            return
+
+        try:
+            value = app._fetch(attr)
+        except Exception as why:
+            self.errors[(name, attr)] = why
+            return
+
+        value._fetched_at = time.time()
+        app._attach(attr, value)
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.streams
+~~~~~~~~~~~~~~
+
+This module contains the long-lived log tail used by App.log_stream.
+"""
+
+from collections import deque
+from threading import Condition, Thread
+
+from requests.exceptions import HTTPError
+
+#: What to do with new lines when the buffer is full.
+DROP = 'drop'
+BLOCK = 'block'
+
+
+class LogStream(object):
+    """A reconnecting tail of an app's logs, read into a bounded buffer.
+
+    A background thread reads lines from logplex into a ring buffer;
+    consumers take them out in batches::
+
+        stream = app.log_stream(buffer_size=50000, policy='drop')
+        for batch in stream:
+            handle(batch)   # a list of bytes lines
+
+    When the connection drops, the stream reconnects with a backlog of
+    ``resume`` lines, skipping the ones it has already delivered. Only
+    that backlog is checked; repeated lines on a live connection are
+    all delivered.
+
+    Client errors from the API (e.g. a revoked key, or a deleted app)
+    aren't retried: the stream closes, keeps the error in ``error``, and
+    raises it from ``batches()`` once the buffer is drained. So does
+    reconnecting ``max_reconnects`` times in a row without a line.
+
+    :param buffer_size: Lines held before the policy applies.
+    :param policy: ``'drop'`` discards the oldest buffered lines when
+        full; ``'block'`` stops reading until the consumer catches up.
+    :param batch_size: Most lines returned per batch.
+    :param resume: Backlog requested when reconnecting; at least 1.
+    :param max_reconnects: Reconnects in a row, without a line read,
+        before giving up. None (the default) never gives up.
+    """
+
+    def __init__(self, app, source=None, ps=None, num=None, buffer_size=10000,
+                 policy=DROP, batch_size=500, resume=100,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0,
+                 max_reconnects=None):
+        super(LogStream, self).__init__()
+
+        if policy not in (DROP, BLOCK):
+            raise ValueError('policy must be {0!r} or {1!r}'.format(DROP, BLOCK))
+
+        # Without a num, the API replays its own default backlog.
+        if resume < 1:
+            raise ValueError('resume must be at least 1')
+
+        self.app = app
+        self.source = source
+        self.ps = ps
+        self.num = num
+        self.policy = policy
+        self.batch_size = batch_size
+        self.resume = resume
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_reconnects = max_reconnects
+
+        #: Counters, see stats.
+        self.received = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.reconnects = 0
+
+        #: The exception that ended the last connection, if any.
+        self.last_error = None
+
+        #: The exception that ended the stream, if any.
+        self.error = None
+
+        self._buffer = deque()
+        self._buffer_size = buffer_size
+        self._cond = Condition()
+        self._closed = False
+        self._response = None
+        self._thread = None
+
+        # Recently delivered lines, for skipping a reconnect's backlog.
+        self._recent = deque(maxlen=resume)
+
+    def __repr__(self):
+        return '<log-stream {0!r} {1}>'.format(self.app, self.stats)
+
+    def __iter__(self):
+        return self.batches()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def stats(self):
+        """Lines received, dropped, skipped (as already delivered) and
+        buffered, and reconnects so far."""
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'buffered': len(self._buffer),
+            'reconnects': self.reconnects,
+        }
+
+    def start(self):
+        """Starts the background reader, if it isn't running already."""
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='heroku-log-stream')
+            self._thread.daemon = True
+            self._thread.start()
+
+        return self
+
+    def close(self):
+        """Stops reading and wakes any waiting consumer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        r = self._response
+        if r is not None:
+            r.close()
+
+    def get_batch(self, timeout=None):
+        """Returns up to batch_size lines, waiting up to timeout for one.
+
+        Returns an empty list on timeout, or once the stream is closed
+        and drained.
+        """
+        with self._cond:
+            if not self._buffer and not self._closed:
+                self._cond.wait(timeout)
+
+            n = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(n)]
+
+            if batch:
+                self._cond.notify_all()
+
+            return batch
+
+    def batches(self, timeout=None):
+        """Yields batches of lines until the stream is closed and drained.
+
+        Raises the error that ended the stream, if one did.
+        """
+        while True:
+            batch = self.get_batch(timeout)
+
+            if batch:
+                yield batch
+            elif self._closed:
+                if self.error is not None:
+                    raise self.error
+
+                return
+
+    def _run(self):
+        delay = self.reconnect_delay
+        num = self.num
+        attempts = 0
+
+        while not self._closed:
+            fresh = False
+
+            try:
+                self._response = self.app._logs_response(
+                    num=num, source=self.source, ps=self.ps, tail=True)
+
+                # A fresh logplex URL is fetched on reconnect; retry.
+                if self._response.status_code >= 400:
+                    raise IOError('Logplex answered {0}'.format(self._response.status_code))
+
+                backlog, left = self._backlog() if self.reconnects else ({}, 0)
+
+                for line in self._response.iter_lines():
+                    if self._closed:
+                        break
+
+                    if not line:
+                        continue
+
+                    # The first lines of a resumed tail replay the log.
+                    if left:
+                        left -= 1
+
+                        if backlog.get(line):
+                            backlog[line] -= 1
+                            self.skipped += 1
+                            continue
+
+                    self._put(line)
+                    self._recent.append(line)
+                    delay = self.reconnect_delay
+                    fresh = True
+
+            except Exception as why:
+                if self._closed:
+                    break
+
+                self.last_error = why
+
+                if _permanent(why):
+                    self._fail(why)
+                    break
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+
+            if self._closed:
+                break
+
+            attempts = 0 if fresh else attempts + 1
+            if self.max_reconnects is not None and attempts > self.max_reconnects:
+                self._fail(self.last_error or IOError('The log stream kept ending.'))
+                break
+
+            # The connection ended; resume with a backlog after a pause.
+            self.reconnects += 1
+            num = self.resume
+
+            with self._cond:
+                self._cond.wait(delay)
+
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _fail(self, why):
+        with self._cond:
+            self.error = why
+            self._closed = True
+            self._cond.notify_all()
+
+    def _backlog(self):
+        """Returns {line: count} of the recently delivered lines, and how
+        many lines a resumed tail replays."""
+
+        backlog = {}
+        for line in self._recent:
+            backlog[line] = backlog.get(line, 0) + 1
+
+        return backlog, self.resume
+
+    def _put(self, line):
+        with self._cond:
+            self.received += 1
+
+            while len(self._buffer) >= self._buffer_size and not self._closed:
+                if self.policy == DROP:
+                    self._buffer.popleft()
+                    self.dropped += 1
+                else:
+                    self._cond.wait()
+
+            self._buffer.append(line)
+            self._cond.notify_all()
+
+
+def _permanent(why):
+    """Whether an error from the logs API won't go away on a retry."""
+
+    status = getattr(getattr(why, 'response', None), 'status_code', None)
+
+    # Timeouts and rate limiting are worth retrying.
+    return (isinstance(why, HTTPError) and status is not None and
+            400 <= status < 500 and status not in (408, 429))
@@ -8,30 +8,90 @@ This module contains the specific Heroku.py data types.
 """
 
 
+def _sort_key(value):
+    # None can't be compared to other values on Python 3.
+    return (value is not None, value)
+
+
 class KeyedListResource(object):
-    """docstring for ListResource"""
+    """A list of resources, addressable by index or by primary key.
+
+    Items may be given as a list, or as an iterator (e.g. from
+    ``Heroku.iter_apps()``), which is consumed only as far as needed.
+    """
 
     def __init__(self, items=None):
         super(KeyedListResource, self).__init__()
 
         self._h = None
-        self._items = items or list()
+        self._loaded = []
+        self._source = None
+        self._items = items
         self._obj = None
         self._kwargs = {}
 
+        #: Lazily-built {primary key: item} index, see _lookup.
+        self._index = None
+
+        #: Lazily-built {attr: {value: [items]}} indexes, see where.
+        self._indexes = {}
+
     def __repr__(self):
         return repr(self._items)
 
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def _items(self):
+        self._fill()
+        return self._loaded
+
+    @_items.setter
+    def _items(self, items):
+        if items is None or isinstance(items, list):
+            self._loaded = items or list()
+            self._source = None
+        else:
+            self._loaded = []
+            self._source = iter(items)
+
+    def _fill(self, n=None):
+        """Loads items from the source until there are n (or all of them)."""
+
+        loaded = self._loaded
+
+        while self._source is not None and (n is None or len(loaded) < n):
+            try:
+                loaded.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
     def __iter__(self):
-        for item in self._items:
-            yield item
+        i = 0
+
+        while True:
+            if i >= len(self._loaded):
+                self._fill(i + 1)
+
+                if i >= len(self._loaded):
+                    return
+
+            yield self._loaded[i]
+            i += 1
 
     def __getitem__(self, key):
 
         # Support index operators.
         if isinstance(key, int):
-            if abs(key) <= len(self._items):
-                return self._items[key]
+            if key >= 0:
+                self._fill(key + 1)
+                items = self._loaded
+            else:
+                items = self._items
+
+            if abs(key) <= len(items):
+                return items[key]
 
         v = self.get(key)
 
@@ -43,26 +103,225 @@ class KeyedListResource(object):
     def add(self, *args, **kwargs):
 
         try:
-            return self[0].new(*args, **kwargs)
+            item = self[0].new(*args, **kwargs)
         except IndexError:
             o = self._obj()
             o._h = self._h
-            o.__dict__.update(self._kwargs)
 
-            return o.new(*args, **kwargs)
+            for (k, v) in self._kwargs.items():
+                setattr(o, k, v)
+
+            item = o.new(*args, **kwargs)
+
+        if hasattr(item, '_ids') and item not in self._items:
+            self._append(item)
+
+        return item
 
 
     def remove(self, key):
         if hasattr(self[0], 'delete'):
-            return self[key].delete()
+            item = self[key]
+            r = item.delete()
+            self._discard(item)
+
+            return r
 
     def get(self, key):
-        for item in self:
-            if key in item._ids:
-                return item
+        if self._index is None:
+            self._index = self._build_index()
+
+        try:
+            return self._index.get(key)
+        except TypeError:
+            # Unhashable keys can't match a primary key.
+            return None
+
+    def _build_index(self):
+        """Maps every primary key value (raw and str) to its item."""
+
+        index = {}
+
+        # The first item to match a key wins, as with a linear scan.
+        for item in self._items:
+            for value in item._ids:
+                try:
+                    index.setdefault(value, item)
+                except TypeError:
+                    pass
+
+        return index
+
+    def _append(self, item):
+        self._items.append(item)
+
+        if self._index is not None:
+            for value in item._ids:
+                try:
+                    self._index.setdefault(value, item)
+                except TypeError:
+                    pass
+
+        for (attr, index) in self._indexes.items():
+            index.setdefault(getattr(item, attr, None), []).append(item)
+
+    def _discard(self, item):
+        try:
+            self._items.remove(item)
+        except ValueError:
+            return
+
+        # Another item may share a key with the removed one; rebuild lazily.
+        self._index = None
+        self._indexes = {}
+
+    def _index_for(self, attr):
+        """Returns the {value: [items]} index of an attribute, in list
+        order, building it on first use."""
+
+        index = self._indexes.get(attr)
+
+        if index is None:
+            index = {}
+
+            for item in self._items:
+                index.setdefault(getattr(item, attr, None), []).append(item)
+
+            self._indexes[attr] = index
+
+        return index
+
+    def _derive(self, items):
+        """Returns a list resource like this one, of the given items."""
+
+        list_resource = type(self)(items=items)
+        list_resource._h = self._h
+        list_resource._obj = self._obj
+        list_resource._kwargs = self._kwargs
+
+        return list_resource
+
+    def where(self, **conditions):
+        """Returns the items whose attributes equal the given values,
+        e.g. ``processes.where(state='crashed', type='web')``.
+
+        Each attribute is looked up in a hash index, built on first use
+        and reused by later queries on this list.
+        """
+
+        buckets = []
+
+        for (attr, value) in conditions.items():
+            index = self._index_for(attr)
+
+            try:
+                buckets.append(index.get(value, []))
+            except TypeError:
+                # Unhashable values can't match an indexed attribute.
+                return self._derive([])
+
+        if not buckets:
+            return self._derive(list(self._items))
+
+        buckets.sort(key=len)
+        items = buckets[0]
+
+        for bucket in buckets[1:]:
+            ids = set(id(item) for item in bucket)
+            items = [item for item in items if id(item) in ids]
+
+        return self._derive(list(items))
+
+    def group_by(self, attr):
+        """Returns ``{value: items}`` of the given attribute."""
+        return dict((value, self._derive(list(items)))
+                    for (value, items) in self._index_for(attr).items())
+
+    def order_by(self, *attrs):
+        """Returns the items sorted by the given attributes; prefix one
+        with '-' for descending order. None sorts before any value:
+        first in ascending order, last in descending order."""
+
+        items = list(self._items)
+
+        # Stable sorts, least significant attribute first.
+        for attr in reversed(attrs):
+            reverse = attr.startswith('-')
+            attr = attr.lstrip('-')
+
+            items.sort(key=lambda item: _sort_key(getattr(item, attr, None)), reverse=reverse)
+
+        return self._derive(items)
 
     def __delitem__(self, key):
-        self[key].delete()
+        item = self[key]
+        item.delete()
+        self._discard(item)
+
+    def to_columns(self, fields=None, use_numpy=None):
+        """Returns the items' fields as ``{field: column}`` arrays::
+
+            cols = h.apps.to_columns(['stack', 'slug_size'])
+            cols['stack'].counts(weights=cols['slug_size'])
+
+        Columns are typed by the model's declarations: ints as int64
+        (or float64, with NaN, when any are missing), dates as
+        datetime64 (or epoch seconds), bools as bools, and strings as
+        Categorical codes. NumPy arrays are built when NumPy
+        is installed, ``array.array`` ones otherwise.
+        """
+        from .columns import to_columns
+
+        items = self._items
+        model = self._obj or (type(items[0]) if items else None)
+
+        if model is None:
+            return dict((field, []) for field in fields or [])
+
+        return to_columns(items, model, fields, use_numpy)
+
+    def prefetch(self, *attrs, **kwargs):
+        """Fetches the given sub-resources of every item concurrently.
+
+        Results are attached to each item, so that later reads (e.g.
+        ``app.addons``) are served from memory. Returns a dict of
+        ``{item id: {attr: exception}}`` for the fetches that failed.
+
+        :param workers: Size of the thread pool. Defaults to 8. The
+            connection pool is grown to match, if it is smaller.
+        """
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        workers = kwargs.pop('workers', 8)
+        errors = {}
+
+        for model in set(type(item) for item in self):
+            for attr in attrs:
+                prop = getattr(model, attr, None)
+
+                if not (isinstance(prop, property) and hasattr(prop.fget, 'fetch')):
+                    raise ValueError('{0}.{1} cannot be prefetched'.format(model.__name__, attr))
+
+        if self._h is not None:
+            self._h._grow_pool(workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+
+            for item in self:
+                for attr in attrs:
+                    futures[pool.submit(item._fetch, attr)] = (item, attr)
+
+            for future in as_completed(futures):
+                item, attr = futures[future]
+
+                try:
+                    item._attach(attr, future.result())
+                except Exception as why:
+                    errors.setdefault(item._id, {})[attr] = why
+
+        return errors
 
 
 
@@ -78,13 +337,25 @@ class ProcessListResource(KeyedListResource):
             return super(ProcessListResource, self).__getitem__(key)
         except KeyError as why:
 
-            c = [p for p in self._items if key == p.type]
+            try:
+                c = self._index_for('type').get(key)
+            except TypeError:
+                c = None
 
             if c:
-                return ProcessTypeListResource(items=c)
+                return ProcessTypeListResource(items=list(c))
             else:
                 raise why
 
+    def scale_many(self, formation, **kwargs):
+        """Scales several process types of this list's app at once.
+
+        See App.scale_many.
+        """
+        app = self._kwargs.get('app') or self[0].app
+
+        return app.scale_many(formation, **kwargs)
+
 
 class ProcessTypeListResource(ProcessListResource):
     """KeyedListResource with basic filtering for process types."""
@@ -120,7 +391,11 @@ class FilteredListResource(KeyedListResource):
     filter_func = staticmethod(lambda item: True)
     
     def __init__(self, items=None):
-        items = [item for item in items if self.filter_func(item)] if items else []
+        if isinstance(items, list):
+            items = [item for item in items if self.filter_func(item)]
+        elif items is not None:
+            items = (item for item in items if self.filter_func(item))
+
         super(FilteredListResource, self).__init__(items)
 
 def filtered_key_list_resource_factory(filter_func):
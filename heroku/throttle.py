@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.throttle
+~~~~~~~~~~~~~~~
+
+This module contains the client-side rate limiter.
+"""
+
+from threading import Lock
+import random
+import time
+
+#: The API's default budget: 4500 requests per hour, per account.
+DEFAULT_CAPACITY = 4500
+DEFAULT_RATE = DEFAULT_CAPACITY / 3600.0
+
+
+class RateLimiter(object):
+    """A token bucket pacing requests to stay under the API's rate limit.
+
+    The bucket refills at ``rate`` tokens per second up to ``capacity``,
+    and is lowered to the ``RateLimit-Remaining`` the API reports. One
+    limiter is shared by every thread using a Heroku instance.
+
+    :param max_retries: Retries of a GET answered with 429 or 503.
+    :param backoff: Base delay, in seconds, doubled on each retry.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_CAPACITY,
+                 max_retries=5, backoff=0.5, max_backoff=60.0):
+        super(RateLimiter, self).__init__()
+
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        #: Counters, see stats.
+        self.waits = 0
+        self.wait_time = 0.0
+        self.retries = 0
+        self.remaining = None
+
+        self._tokens = self.capacity
+        self._updated = time.time()
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<rate-limiter {0}>'.format(self.stats)
+
+    @property
+    def tokens(self):
+        """Tokens currently available (negative while requests queue)."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    @property
+    def stats(self):
+        return {
+            'tokens': self.tokens,
+            'remaining': self.remaining,
+            'waits': self.waits,
+            'wait_time': self.wait_time,
+            'retries': self.retries,
+        }
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+
+            # Reserve the token now, so concurrent callers queue up behind.
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+            if wait:
+                self.waits += 1
+                self.wait_time += wait
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def update(self, response):
+        """Syncs the bucket with the API's RateLimit-Remaining header."""
+        remaining = response.headers.get('RateLimit-Remaining')
+
+        if remaining is None:
+            return
+
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+
+        with self._lock:
+            self.remaining = remaining
+            self._refill()
+            self._tokens = min(self._tokens, remaining)
+
+    def retry_delay(self, attempt, response):
+        """Returns the pause before retrying a throttled request."""
+        with self._lock:
+            self.retries += 1
+
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            pass
+
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+
+        # Jitter, so that throttled threads don't retry in lockstep.
+        return random.uniform(delay / 2, delay)
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+"""
+heroku.watch
+~~~~~~~~~~~~
+
+This module contains the change notifications behind App.watch: one
+scheduler thread polls every watched app, diffs successive snapshots and
+emits typed events.
+"""
+
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+import time
+
+from .models import Process, Release
+
+
+class WatchEvent(object):
+    """Something that changed on a watched app.
+
+    ``old`` and ``new`` are the item before and after the change (None
+    when it was added or removed).
+    """
+
+    def __init__(self, app, old=None, new=None):
+        super(WatchEvent, self).__init__()
+
+        self.app = app
+        self.old = old
+        self.new = new
+        self.time = time.time()
+
+    def __repr__(self):
+        return '<{0} {1!r} {2!r}>'.format(type(self).__name__, self.app, self.new or self.old)
+
+
+class ProcessAdded(WatchEvent):
+    pass
+
+
+class ProcessRemoved(WatchEvent):
+    pass
+
+
+class ProcessStateChanged(WatchEvent):
+    """A process moved between states, e.g. from 'up' to 'crashed'."""
+    pass
+
+
+class ReleaseCreated(WatchEvent):
+    pass
+
+
+class ConfigVarChanged(WatchEvent):
+    """A config var was set, changed or removed; old and new are values."""
+
+    def __init__(self, app, key, old=None, new=None):
+        super(ConfigVarChanged, self).__init__(app, old, new)
+        self.key = key
+
+    def __repr__(self):
+        return '<{0} {1!r} {2}>'.format(type(self).__name__, self.app, self.key)
+
+
+class WatchError(WatchEvent):
+    """A poll failed; the watch carries on, backing off."""
+
+    def __init__(self, app, error):
+        super(WatchError, self).__init__(app)
+        self.error = error
+
+    def __repr__(self):
+        return '<{0} {1!r} {2!r}>'.format(type(self).__name__, self.app, self.error)
+
+
+def _keyed(model, items):
+    pk = model._pks[0]
+    return dict((item.get(pk), item) for item in items)
+
+
+def _diff_processes(watch, old, new):
+    old, new = _keyed(Process, old), _keyed(Process, new)
+
+    for (key, item) in new.items():
+        if key not in old:
+            yield ProcessAdded(watch.app, new=watch._model(Process, item))
+        elif old[key].get('state') != item.get('state'):
+            yield ProcessStateChanged(watch.app, watch._model(Process, old[key]), watch._model(Process, item))
+
+    for (key, item) in old.items():
+        if key not in new:
+            yield ProcessRemoved(watch.app, old=watch._model(Process, item))
+
+
+def _diff_releases(watch, old, new):
+    old = _keyed(Release, old)
+
+    for item in new:
+        if item.get(Release._pks[0]) not in old:
+            yield ReleaseCreated(watch.app, new=watch._model(Release, item))
+
+
+def _diff_config(watch, old, new):
+    for key in sorted(set(old) | set(new)):
+        if old.get(key) != new.get(key):
+            yield ConfigVarChanged(watch.app, key, old.get(key), new.get(key))
+
+
+#: What can be watched: {attr: (app sub-resource, differ)}.
+WATCHABLE = {
+    'processes': ('ps', _diff_processes),
+    'releases': ('releases', _diff_releases),
+    'config': ('config_vars', _diff_config),
+}
+
+
+class Watch(object):
+    """The watch of one app; iterate it for events, unless it was given
+    a callback."""
+
+    def __init__(self, app, attrs, callback=None, min_interval=1.0,
+                 max_interval=60.0, backoff=2.0):
+        super(Watch, self).__init__()
+
+        self.app = app
+        self.attrs = list(attrs)
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        #: Seconds until the next poll.
+        self.interval = min_interval
+
+        #: Counters: polls made, and events emitted.
+        self.polls = 0
+        self.events = 0
+
+        self._closed = False
+        self._last = {}
+        self._validators = {}
+        self._queue = deque()
+        self._cond = Condition()
+
+    def __repr__(self):
+        return '<watch {0!r} {1} interval={2}>'.format(self.app, self.attrs, self.interval)
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+
+            if event is None:
+                return
+
+            yield event
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Stops watching, and wakes any waiting consumer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Returns the next event, or None on timeout or once closed."""
+        with self._cond:
+            if not self._queue and not self._closed:
+                self._cond.wait(timeout)
+
+            return self._queue.popleft() if self._queue else None
+
+    def _emit(self, event):
+        self.events += 1
+
+        if self.callback is not None:
+            self.callback(event)
+            return
+
+        with self._cond:
+            self._queue.append(event)
+            self._cond.notify_all()
+
+    def _model(self, model, item):
+        return model.new_from_dict(item, h=self.app._h, lazy=True, app=self.app)
+
+    def _fetch(self, attr):
+        """Returns the current body of an attr's resource, or the last
+        one (the very same object) if it hasn't changed."""
+
+        resource = ('apps', self.app.name, WATCHABLE[attr][0])
+        held = self._validators.get(attr)
+
+        r = self.app._h._http_resource('GET', resource, headers=held)
+
+        validators = {}
+        if r.headers.get('ETag'):
+            validators['If-None-Match'] = r.headers['ETag']
+        if r.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = r.headers['Last-Modified']
+
+        # A client-wide response cache may answer our 304 with its copy.
+        if attr in self._last and (r.status_code == 304 or (held and validators == held)):
+            return self._last[attr]
+
+        self._validators[attr] = validators
+
+        return self.app._h._decode(r)
+
+    def _poll(self):
+        """Polls every attr once; returns whether anything changed."""
+
+        changed = False
+        self.polls += 1
+
+        for attr in self.attrs:
+            differ = WATCHABLE[attr][1]
+            data = self._fetch(attr)
+
+            last = self._last.get(attr)
+            self._last[attr] = data
+
+            if last is None or last is data:
+                continue
+
+            for event in differ(self, last, data):
+                changed = True
+                self._emit(event)
+
+        return changed
+
+    def _next_interval(self, changed):
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return self.interval
+
+
+class Watcher(object):
+    """Polls any number of watched apps from a single scheduler thread.
+
+    Each app is polled with conditional requests, whose validators are
+    held by its Watch (the instance's response cache is left as is),
+    every ``min_interval`` seconds while it is changing, backing off up
+    to ``max_interval`` while it isn't. Polls run on a pool of
+    ``workers`` threads.
+    """
+
+    def __init__(self, h, workers=8):
+        super(Watcher, self).__init__()
+
+        self.workers = workers
+
+        self._h = h
+        self._heap = []
+        self._watches = set()
+        self._seq = count()
+        self._cond = Condition()
+        self._closed = False
+        self._thread = None
+        self._pool = None
+
+    def __repr__(self):
+        return '<watcher scheduled={0}>'.format(len(self._heap))
+
+    def watch(self, app, attrs=('processes', 'releases', 'config'), callback=None,
+              **kwargs):
+        """Returns a new Watch of the given app's attrs.
+
+        The first poll records a baseline; events are emitted for
+        changes after it.
+        """
+
+        for attr in attrs:
+            if attr not in WATCHABLE:
+                raise ValueError('Cannot watch {0!r}'.format(attr))
+
+        watch = Watch(app, attrs, callback=callback, **kwargs)
+
+        with self._cond:
+            self._watches.add(watch)
+
+        self.start()
+        self._schedule(watch, 0)
+
+        return watch
+
+    def start(self):
+        if self._thread is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._thread = Thread(target=self._run, name='heroku-watcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+        return self
+
+    def close(self):
+        """Stops polling; closes every watch."""
+        # Every watch, including those being polled right now.
+        with self._cond:
+            self._closed = True
+            watches = list(self._watches)
+            self._cond.notify_all()
+
+        for watch in watches:
+            watch.close()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def _schedule(self, watch, delay):
+        with self._cond:
+            heappush(self._heap, (time.time() + delay, next(self._seq), watch))
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.time()
+
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+                if self._closed:
+                    return
+
+                watch = heappop(self._heap)[2]
+
+            if not watch.closed:
+                self._pool.submit(self._poll, watch)
+            else:
+                with self._cond:
+                    self._watches.discard(watch)
+
+    def _poll(self, watch):
+        try:
+            changed = watch._poll()
+        except Exception as why:
+            changed = False
+
+            # A failing callback mustn't stop the watch.
+            try:
+                watch._emit(WatchError(watch.app, why))
+            except Exception:
+                pass
+
+        if not (watch.closed or self._closed):
+            self._schedule(watch, watch._next_interval(changed))
+        else:
+            with self._cond:
+                self._watches.discard(watch)
@@ -19,6 +19,10 @@ required = [
     'python-dateutil==1.5'
 ]
 
+# Thread pools (prefetch, scale_many, snapshots, watches) need the backport.
+if sys.version_info < (3,):
+    required.append('futures')
+
 
 setup(
     name='heroku',
@@ -33,6 +37,7 @@ setup(
     package_data={'': ['LICENSE',]},
     include_package_data=True,
     install_requires=required,
+    extras_require={'async': ['aiohttp'], 'numpy': ['numpy']},
     license='MIT',
     classifiers=(
         'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.aio, run against the local benchmarks stub server.
+"""
+
+import asyncio
+import unittest
+
+from requests.exceptions import HTTPError
+
+from benchmarks.server import StubServer
+from heroku.aio import (
+    AsyncApp, AsyncConfigVars, AsyncHeroku, AsyncKeyedListResource,
+    AsyncProcess, AsyncProcessListResource
+)
+from heroku.structures import ProcessTypeListResource
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncHerokuTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes={'apps': 20, 'ps': 6}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def call(self, func, **kwargs):
+        """Runs func(h) on a fresh, authenticated AsyncHeroku."""
+
+        async def main():
+            async with AsyncHeroku(**kwargs) as h:
+                h._heroku_url = self.server.url
+                self.assertTrue(await h.authenticate('key'))
+
+                return await func(h)
+
+        return run(main())
+
+    def test_apps(self):
+        apps = self.call(lambda h: h.apps)
+
+        self.assertIsInstance(apps, AsyncKeyedListResource)
+        self.assertEqual(len(apps), 20)
+        self.assertIsInstance(apps['bench-app-3'], AsyncApp)
+        self.assertEqual(apps['bench-app-3'].stack, 'cedar')
+        self.assertEqual(apps[0].created_at.year, 2013)
+
+    def test_lazy_apps(self):
+        apps = self.call(lambda h: h.apps, lazy=True)
+
+        self.assertEqual(apps['bench-app-4'].slug_size, 20000000 + 4 * 1024)
+
+    def test_processes(self):
+        async def main(h):
+            app = (await h.apps)[0]
+            return app, await app.processes
+
+        app, ps = self.call(main)
+
+        self.assertIsInstance(ps, AsyncProcessListResource)
+        self.assertEqual(len(ps), 6)
+        self.assertIsInstance(ps['web.1'], AsyncProcess)
+        self.assertIs(ps['web.1'].app, app)
+
+        web = ps['web']
+        self.assertIsInstance(web, ProcessTypeListResource)
+        self.assertEqual([p.process for p in web], ['web.1', 'web.2'])
+
+    def test_gather(self):
+        async def main(h):
+            apps = await h.apps
+            return await asyncio.gather(*[app.processes for app in apps])
+
+        self.server.reset_stats()
+        results = self.call(main, concurrency=5)
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(len(ps) == 6 for ps in results))
+        self.assertEqual(self.server.stats['requests'], 1 + 1 + 20)
+
+    def test_config(self):
+        async def main(h):
+            config = await (await h.apps)[0].config
+            return config, await config.update({'FOO': 'bar'})
+
+        config, ok = self.call(main)
+
+        self.assertIsInstance(config, AsyncConfigVars)
+        self.assertTrue(ok)
+
+    def test_scale_many(self):
+        async def main(h):
+            app = (await h.apps)[0]
+            started = await app.scale_many({'web': 2, 'worker': 3}, wait=False)
+            waited = await (await app.processes).scale_many(
+                {'web': 2}, timeout=0.05, interval=0.01)
+
+            return started, waited
+
+        self.server.reset_stats()
+        started, waited = self.call(main)
+
+        self.assertEqual(started['worker']['requested'], 3)
+        self.assertIsNone(started['worker']['up'])
+
+        # One of the stub's two web processes is up.
+        self.assertEqual(waited['web']['up'], 1)
+        self.assertFalse(waited['web']['converged'])
+        self.assertGreaterEqual(self.server.stats['requests'], 1 + 1 + 3 + 1 + 1 + 1)
+
+    def test_config_set(self):
+        async def main(h):
+            config = await (await h.apps)[1].config
+            await config.set('VAR_0', 'changed')
+            await config.set('NEW', 'value')
+            return config
+
+        config = self.call(main)
+
+        self.assertEqual(config.data['VAR_0'], 'changed')
+        self.assertEqual(config.data['NEW'], 'value')
+        self.assertIn('VAR_1', config.data)
+
+    def test_remove(self):
+        async def main(h):
+            addons = await (await h.apps)[0].addons
+            return addons, await addons.remove('addon-1:plan-1')
+
+        self.server.reset_stats()
+        addons, ok = self.call(main)
+
+        self.assertTrue(ok)
+        self.assertIsNone(addons.get('addon-1:plan-1'))
+        self.assertEqual(self.server.writes,
+                         [('DELETE', '/apps/bench-app-0/addons/addon-1:plan-1', b'')])
+
+    def test_delitem(self):
+        async def main(h):
+            return await (await h.apps)[0].addons
+
+        addons = self.call(main)
+        self.server.reset_stats()
+
+        with self.assertRaises(TypeError):
+            del addons['addon-1:plan-1']
+
+        self.assertIsNotNone(addons.get('addon-1:plan-1'))
+        self.assertEqual(self.server.writes, [])
+
+    def test_not_found(self):
+        async def main(h):
+            return await h._get_resource(('apps', 'missing'), AsyncApp)
+
+        with self.assertRaises(HTTPError) as cm:
+            self.call(main)
+
+        self.assertEqual(cm.exception.response.status_code, 404)
+
+    def test_blocking_apis(self):
+        async def main(h):
+            apps = await h.apps
+            return apps, await apps[0].processes, await apps[0].config
+
+        apps, ps, config = self.call(main)
+        app = apps[0]
+
+        blocking = (
+            lambda: apps.prefetch('addons'),
+            lambda: ps.prefetch('addons'),
+            app.iter_releases,
+            app.iter_processes,
+            app.watch,
+            app.log_stream,
+            config.batch,
+            lambda: config.__setitem__('FOO', 'bar'),
+            lambda: config.__delitem__('FOO'),
+        )
+
+        for func in blocking:
+            self.assertRaises(TypeError, func)
+
+
+if __name__ == '__main__':
+    unittest.main()
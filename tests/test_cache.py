@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.cache.
+"""
+
+from threading import Event, Thread
+import time
+import unittest
+
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.cache import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def run_concurrently(self, flights, key, func, n):
+        """Calls flights.do(key, func) from n threads, once the first
+        is in flight; returns each caller's result or exception."""
+
+        outcomes = [None] * n
+
+        def call(i):
+            try:
+                outcomes[i] = flights.do(key, func)
+            except Exception as why:
+                outcomes[i] = why
+
+        threads = [Thread(target=call, args=(i,)) for i in range(n)]
+
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+
+        for thread in threads[1:]:
+            thread.start()
+
+        # Let the followers join the flight before it lands.
+        deadline = time.time() + 5
+        while flights.shared < n - 1 and time.time() < deadline:
+            time.sleep(0.001)
+
+        self.release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        return outcomes
+
+    def setUp(self):
+        self.started = Event()
+        self.release = Event()
+        self.calls = 0
+
+    def test_shares_result(self):
+        result = object()
+
+        def func():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            return result
+
+        flights = SingleFlight()
+        outcomes = self.run_concurrently(flights, 'k', func, 8)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(flights.shared, 7)
+        self.assertTrue(all(outcome is result for outcome in outcomes))
+
+    def test_shares_exception(self):
+        error = ValueError('boom')
+
+        def func():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            raise error
+
+        outcomes = self.run_concurrently(SingleFlight(), 'k', func, 8)
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+
+    def test_lands(self):
+        flights = SingleFlight()
+
+        self.assertEqual(flights.do('k', lambda: 1), 1)
+        self.assertEqual(flights.do('k', lambda: 2), 2)
+        self.assertEqual(flights._flights, {})
+        self.assertEqual(flights.shared, 0)
+
+    def test_keys_are_separate(self):
+        flights = SingleFlight()
+
+        def func():
+            return flights.do('b', lambda: 'inner')
+
+        self.assertEqual(flights.do('a', func), 'inner')
+
+
+class CoalesceTestCase(unittest.TestCase):
+
+    def test_concurrent_gets(self):
+        with StubServer(sizes={'apps': 50}, latency=0.2) as server:
+            h = Heroku(coalesce=True)
+            h._heroku_url = server.url
+
+            results = []
+            threads = [Thread(target=lambda: results.append(h.apps)) for _ in range(8)]
+
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+            self.assertEqual(len(results), 8)
+            self.assertTrue(all(len(apps) == 50 for apps in results))
+            self.assertEqual(server.stats['requests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.columns.
+"""
+
+import math
+import unittest
+
+from benchmarks import fixtures
+from heroku.compat import import_numpy
+from heroku.models import App
+from heroku.structures import KeyedListResource
+
+
+class ColumnsTestCase(unittest.TestCase):
+
+    def apps(self, slug_sizes):
+        items = []
+
+        for (d, slug_size) in zip(fixtures.apps(len(slug_sizes)), slug_sizes):
+            d['slug_size'] = slug_size
+            items.append(App.new_from_dict(d))
+
+        return KeyedListResource(items=items)
+
+    def test_ints(self):
+        cols = self.apps([1, 2, 3]).to_columns(['slug_size'], use_numpy=False)
+
+        self.assertIn(cols['slug_size'].typecode, 'lq')
+        self.assertEqual(list(cols['slug_size']), [1, 2, 3])
+
+    def test_missing_ints(self):
+        cols = self.apps([1, None, 3]).to_columns(['slug_size'], use_numpy=False)
+        values = cols['slug_size']
+
+        self.assertEqual(values.typecode, 'd')
+        self.assertEqual((values[0], values[2]), (1.0, 3.0))
+        self.assertTrue(math.isnan(values[1]))
+
+    @unittest.skipIf(import_numpy() is None, 'NumPy is not installed.')
+    def test_numpy_ints(self):
+        numpy = import_numpy()
+
+        cols = self.apps([1, 2, 3]).to_columns(['slug_size'], use_numpy=True)
+        self.assertEqual(cols['slug_size'].dtype, numpy.int64)
+
+        cols = self.apps([1, None, 3]).to_columns(['slug_size', 'stack'], use_numpy=True)
+        values = cols['slug_size']
+
+        self.assertEqual(values.dtype, numpy.float64)
+        self.assertEqual(numpy.isnan(values).tolist(), [False, True, False])
+        self.assertEqual(numpy.nansum(values), 4)
+
+        # Missing values don't vanish from weighted counts.
+        totals = cols['stack'].counts(weights=values)
+        self.assertTrue(any(math.isnan(total) for total in totals.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.helpers.
+"""
+
+import json
+import unittest
+
+from heroku.helpers import iter_json_array
+
+
+class IterJSONArrayTestCase(unittest.TestCase):
+
+    items = [
+        1, -2.5e10, 0.000001, 12345678901234567890, True, False, None,
+        'x"y', u'\xe9', {'a': [1, 2.5]}, [3, [4]], [], {},
+    ]
+
+    def test_whole(self):
+        body = json.dumps(self.items).encode('utf-8')
+        self.assertEqual(list(iter_json_array([body])), self.items)
+
+    def test_chunk_boundaries(self):
+        body = json.dumps(self.items).encode('utf-8')
+
+        # Every split into three chunks, including empty ones.
+        for i in range(len(body) + 1):
+            for j in range(i, len(body) + 1):
+                chunks = [body[:i], body[i:j], body[j:]]
+                self.assertEqual(list(iter_json_array(chunks)), self.items, chunks)
+
+    def test_split_numbers(self):
+        self.assertEqual(list(iter_json_array([b'[2.', b'5]'])), [2.5])
+        self.assertEqual(list(iter_json_array([b'[1', b'e3, -', b'4]'])), [1000.0, -4])
+        self.assertEqual(list(iter_json_array([b'[tr', b'ue,nu', b'll]'])), [True, None])
+
+    def test_empty(self):
+        self.assertEqual(list(iter_json_array([b'[', b' ]'])), [])
+
+    def test_truncated(self):
+        self.assertRaises(ValueError, list, iter_json_array([b'[1, 2.']))
+        self.assertRaises(ValueError, list, iter_json_array([b'[1, 2']))
+
+    def test_not_an_array(self):
+        self.assertRaises(ValueError, list, iter_json_array([b'{"a": 1}']))
+
+
+if __name__ == '__main__':
+    unittest.main()
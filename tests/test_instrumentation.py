@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the request hooks and heroku.instrumentation.
+"""
+
+import unittest
+
+from requests.exceptions import HTTPError
+
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.models import App
+
+
+class HooksTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes={'apps': 3}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.h = Heroku(metrics=True)
+        self.h._heroku_url = self.server.url
+
+        self.events = []
+
+    def broken(self, event):
+        raise RuntimeError('broken hook')
+
+    def test_events(self):
+        self.h.register_hook('post_request', self.events.append)
+        self.h.apps
+
+        self.assertEqual([(e.method, e.route, e.status) for e in self.events],
+                         [('GET', 'apps', 200)])
+        self.assertIsNone(self.events[0].error)
+
+    def test_unknown_event(self):
+        self.assertRaises(ValueError, self.h.register_hook, 'nope', self.events.append)
+
+    def test_failing_hooks_are_logged(self):
+        self.h.register_hook('pre_request', self.broken)
+        self.h.register_hook('post_request', self.broken)
+        self.h.register_hook('post_request', self.events.append)
+
+        with self.assertLogs('heroku.api', 'ERROR') as logs:
+            apps = self.h.apps
+
+        self.assertEqual(len(apps), 3)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('broken hook', logs.output[0])
+
+        # Hooks after the failing one still run; so does the aggregator.
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.h.metrics.snapshot()[('GET', 'apps')]['count'], 1)
+
+    def test_failing_hooks_keep_the_request_error(self):
+        self.h.register_hook('post_request', self.broken)
+
+        with self.assertLogs('heroku.api', 'ERROR'):
+            with self.assertRaises(HTTPError) as raised:
+                self.h._get_resource(('apps', 'missing'), App)
+
+        self.assertEqual(raised.exception.response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
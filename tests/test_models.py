@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.models, run against the local benchmarks stub server.
+"""
+
+import unittest
+
+from benchmarks import fixtures
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.models import Process
+
+
+class ProcessNewTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes={'apps': 2, 'ps': 4}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.h = Heroku()
+        self.h._heroku_url = self.server.url
+
+        self.app = self.h.apps[0]
+        self.app._attach('processes', self.app.processes)
+
+    def test_unnamed_response(self):
+        # The stub answers writes with an empty object.
+        self.server.reset_stats()
+        process = self.app.processes[0].new('rake db:migrate')
+
+        self.assertIsNone(process)
+        self.assertEqual(self.server.writes[0][:2], ('POST', '/apps/bench-app-0/ps'))
+
+        # The held processes are dropped, not refetched.
+        self.assertEqual(self.server.stats['requests'], 1)
+        self.assertNotIn('processes', self.app._prefetched)
+
+    def test_named_response(self):
+        held = self.app.processes
+        d = dict(fixtures.processes(self.app.name, 1)[0], process='run.1', upid='99')
+        process = Process.new_from_dict(d, h=self.h, app=self.app)
+
+        self.assertIs(self.app._created('processes', process, None), process)
+        self.assertIs(self.app.processes, held)
+        self.assertIs(held['run.1'], process)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.snapshot, run against the local benchmarks stub server.
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    sizes = {'apps': 5, 'addons': 4, 'config_vars': 3}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes=cls.sizes).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'heroku.db')
+
+        self.h = self.heroku()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def heroku(self):
+        h = Heroku()
+        h._heroku_url = self.server.url
+
+        return h
+
+    def save(self):
+        apps = self.h.apps
+        apps.prefetch('addons', 'config')
+
+        self.assertEqual(self.h.save_snapshot(self.path, apps), 1 + 2 * len(apps))
+
+        return apps
+
+    def test_round_trip(self):
+        saved = self.save()
+
+        h = self.heroku()
+        self.server.reset_stats()
+        apps = h.load_snapshot(self.path, max_age=600)
+
+        self.assertEqual([app.name for app in apps], [app.name for app in saved])
+        self.assertEqual(apps[2].created_at, saved[2].created_at)
+        self.assertEqual([a.name for a in apps[2].addons], [a.name for a in saved[2].addons])
+        self.assertEqual(apps[2].config.data, saved[2].config.data)
+        self.assertIs(apps[2].addons[0].app, apps[2])
+        self.assertIs(apps['bench-app-2'], apps[2])
+
+        self.assertIsNone(h.snapshot_refresh)
+        self.assertEqual(self.server.stats['requests'], 0)
+
+    def test_owner_only(self):
+        self.save()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_narrows_existing_file(self):
+        open(self.path, 'w').close()
+        os.chmod(self.path, 0o644)
+
+        self.save()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_stale_refresh(self):
+        self.save()
+
+        path = '/apps/bench-app-2/config_vars'
+        original = self.server.payload(path)
+        self.server.update_config(path, {'FRESH': 'yes'})
+
+        try:
+            h = self.heroku()
+            apps = h.load_snapshot(self.path, max_age=0)
+            loaded = apps['bench-app-2']
+
+            self.assertNotIn('FRESH', loaded.config.data)
+            self.assertTrue(h.snapshot_refresh.wait(10))
+
+            self.assertEqual(h.snapshot_refresh.errors, {})
+            self.assertEqual(len(h.snapshot_refresh.stale), 1 + 2 * len(apps))
+            self.assertIs(apps['bench-app-2'], loaded)
+            self.assertEqual(loaded.config.data['FRESH'], 'yes')
+        finally:
+            self.server.set_payload(path, original)
+
+    def test_no_refresh(self):
+        self.save()
+
+        h = self.heroku()
+        self.server.reset_stats()
+        h.load_snapshot(self.path, max_age=0, refresh=False)
+
+        self.assertIsNone(h.snapshot_refresh)
+        self.assertEqual(self.server.stats['requests'], 0)
+
+    def test_saves_loaded_apps(self):
+        self.save()
+
+        h = self.heroku()
+        h.load_snapshot(self.path)
+        self.server.reset_stats()
+
+        self.assertEqual(h.save_snapshot(self.path), 1 + 2 * self.sizes['apps'])
+        self.assertEqual(self.server.stats['requests'], 0)
+
+    def test_missing(self):
+        self.assertRaises(IOError, self.h.load_snapshot, self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a database' * 100)
+
+        self.assertRaises(ValueError, self.h.load_snapshot, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
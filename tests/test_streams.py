@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.streams, run against the local benchmarks stub server.
+"""
+
+import unittest
+
+from requests.exceptions import HTTPError
+
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.models import App
+
+
+class LogStreamTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes={'apps': 2}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.h = Heroku()
+        self.h._heroku_url = self.server.url
+
+        self.app = self.h.apps[0]
+
+    def stream(self, app=None, **kwargs):
+        kwargs.setdefault('reconnect_delay', 0.01)
+        kwargs.setdefault('max_reconnects', 2)
+
+        return (app or self.app).log_stream(**kwargs)
+
+    def read(self, stream):
+        """Returns the lines read, and the error that ended the stream."""
+
+        lines = []
+
+        try:
+            for batch in stream.batches(timeout=5):
+                lines.extend(batch)
+        except Exception as why:
+            return lines, why
+
+        return lines, None
+
+    def test_skips_backlog_after_reconnect(self):
+        self.server.logplex = [
+            b'one\ntwo\nthree\n',
+            # The last three lines again, then new ones.
+            b'one\ntwo\nthree\nfour\nfive\n',
+        ]
+
+        stream = self.stream(resume=3)
+        lines, _ = self.read(stream)
+
+        self.assertEqual(lines, [b'one', b'two', b'three', b'four', b'five'])
+        self.assertEqual(stream.stats['skipped'], 3)
+
+    def test_delivers_repeated_lines(self):
+        self.server.logplex = [b'same\nsame\nsame\n']
+
+        stream = self.stream(resume=3)
+        lines, _ = self.read(stream)
+
+        self.assertEqual(lines, [b'same'] * 3)
+        self.assertEqual(stream.stats['skipped'], 0)
+
+    def test_repeats_after_backlog_are_new(self):
+        self.server.logplex = [
+            b'a\nsame\n',
+            b'a\nsame\nsame\nb\n',
+        ]
+
+        stream = self.stream(resume=2)
+        lines, _ = self.read(stream)
+
+        self.assertEqual(lines, [b'a', b'same', b'same', b'b'])
+        self.assertEqual(stream.stats['skipped'], 2)
+
+    def test_gives_up_after_max_reconnects(self):
+        stream = self.stream(max_reconnects=3)
+        lines, error = self.read(stream)
+
+        self.assertEqual(lines, [])
+        self.assertIsInstance(error, IOError)
+        self.assertEqual(stream.reconnects, 3)
+
+    def test_client_errors_are_terminal(self):
+        app = App.new_from_dict({'name': 'missing', 'created_at': '2013-01-01T00:00:00Z'}, h=self.h)
+        stream = self.stream(app, max_reconnects=None)
+
+        lines, error = self.read(stream)
+
+        self.assertIsInstance(error, HTTPError)
+        self.assertEqual(error.response.status_code, 404)
+        self.assertIs(stream.error, error)
+        self.assertTrue(stream.closed)
+        self.assertEqual(stream.reconnects, 0)
+
+    def test_resume_must_be_positive(self):
+        self.assertRaises(ValueError, self.app.log_stream, resume=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.structures.
+"""
+
+import unittest
+
+from requests.adapters import HTTPAdapter
+
+from benchmarks import fixtures
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.models import Process
+from heroku.structures import ProcessListResource
+
+
+class PrefetchTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(sizes={'apps': 10}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.h = Heroku()
+        self.h._heroku_url = self.server.url
+
+    def test_prefetch(self):
+        apps = self.h.apps
+        self.assertEqual(apps.prefetch('addons', 'config'), {})
+
+        self.server.reset_stats()
+        self.assertEqual(len(apps[3].addons), 20)
+        self.assertEqual(len(apps[3].config.data), 50)
+        self.assertEqual(self.server.stats['requests'], 0)
+
+    def test_invalid_attrs(self):
+        apps = self.h.apps
+        self.server.reset_stats()
+
+        for attr in ('info', 'name', 'missing'):
+            self.assertRaises(ValueError, apps.prefetch, 'addons', attr)
+
+        self.assertEqual(self.server.stats['requests'], 0)
+
+    def test_grows_the_resolved_adapter(self):
+        mounted = HTTPAdapter(pool_maxsize=4)
+        self.h._session.mount(self.server.url, mounted)
+
+        self.h.apps.prefetch('addons', workers=16)
+
+        grown = self.h._session.get_adapter(self.server.url)
+        self.assertIsNot(grown, mounted)
+        self.assertEqual(grown._pool_maxsize, 16)
+        self.assertIs(self.h._session.adapters[self.server.url], grown)
+
+    def test_never_shrinks(self):
+        h = Heroku(pool_maxsize=64)
+        h._heroku_url = self.server.url
+        adapter = h._session.get_adapter(self.server.url)
+
+        h.apps.prefetch('addons', workers=16)
+
+        self.assertIs(h._session.get_adapter(self.server.url), adapter)
+
+
+class QueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        items = []
+
+        for (i, d) in enumerate(fixtures.processes('bench-app-0', 6)):
+            d['state'] = ['up', 'crashed', None][i % 3]
+            d['elapsed'] = [3, None, 1, 2, None, 0][i]
+            items.append(Process.new_from_dict(d))
+
+        self.ps = ProcessListResource(items=items)
+
+    def test_where(self):
+        crashed = self.ps.where(state='crashed')
+
+        self.assertEqual([p.process for p in crashed], [self.ps[1].process, self.ps[4].process])
+        self.assertIsInstance(crashed, ProcessListResource)
+        self.assertEqual(len(self.ps.where(state='crashed', elapsed=None)), 2)
+        self.assertEqual(len(self.ps.where(state='missing')), 0)
+        self.assertEqual(len(self.ps.where()), 6)
+
+    def test_where_unhashable(self):
+        self.assertEqual(len(self.ps.where(state=['up'])), 0)
+        self.assertEqual(len(self.ps.where(state='up', elapsed={})), 0)
+        self.assertIsNone(self.ps.get(['up']))
+
+    def test_group_by(self):
+        groups = self.ps.group_by('state')
+
+        self.assertEqual(sorted(len(items) for items in groups.values()), [2, 2, 2])
+        self.assertIn(None, groups)
+
+    def test_order_by_none(self):
+        ascending = [p.elapsed for p in self.ps.order_by('elapsed')]
+        descending = [p.elapsed for p in self.ps.order_by('-elapsed')]
+
+        self.assertEqual(ascending, [None, None, 0, 1, 2, 3])
+        self.assertEqual(descending, [3, 2, 1, 0, None, None])
+
+    def test_order_by_many(self):
+        ordered = self.ps.order_by('state', '-elapsed')
+
+        self.assertEqual([(p.state, p.elapsed) for p in ordered], [
+            (None, 1), (None, 0), ('crashed', None), ('crashed', None), ('up', 3), ('up', 2)
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
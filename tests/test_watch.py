@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for heroku.watch, run against the local benchmarks stub server.
+"""
+
+from threading import Thread
+import time
+import unittest
+
+from benchmarks import fixtures
+from benchmarks.server import StubServer
+from heroku.api import Heroku
+from heroku.watch import (
+    ConfigVarChanged, ProcessAdded, ProcessRemoved, ProcessStateChanged,
+    ReleaseCreated
+)
+
+
+class WatchTestCase(unittest.TestCase):
+
+    sizes = {'apps': 3, 'ps': 6, 'releases': 3, 'config_vars': 3}
+
+    def setUp(self):
+        self.server = StubServer(sizes=self.sizes).start()
+
+        self.h = Heroku()
+        self.h._heroku_url = self.server.url
+        self.app = self.h.apps['bench-app-1']
+
+    def tearDown(self):
+        self.h.watcher.close()
+        self.server.stop()
+
+    def watch(self, attrs, **kwargs):
+        kwargs.setdefault('min_interval', 0.02)
+        kwargs.setdefault('max_interval', 0.05)
+
+        watch = self.app.watch(attrs, **kwargs)
+
+        # Wait for the baseline poll.
+        while watch.polls < 1:
+            self.assertIsNone(watch.get(0.01))
+
+        return watch
+
+    def events(self, watch, n):
+        events = [watch.get(5) for _ in range(n)]
+        self.assertIsNone(watch.get(0.2))
+
+        return events
+
+    def test_processes(self):
+        watch = self.watch(['processes'])
+
+        ps = fixtures.processes('bench-app-1', 6)
+        ps[0]['state'] = 'crashed'
+        removed = ps.pop(1)
+        ps.append(dict(ps[1], process='web.9', upid='9'))
+        self.server.set_payload('/apps/bench-app-1/ps', ps)
+
+        events = sorted(self.events(watch, 3), key=lambda e: type(e).__name__)
+
+        self.assertEqual([type(e) for e in events], [ProcessAdded, ProcessRemoved, ProcessStateChanged])
+        self.assertEqual(events[0].new.process, 'web.9')
+        self.assertEqual(events[1].old.process, removed['process'])
+        self.assertEqual((events[2].old.state, events[2].new.state), ('up', 'crashed'))
+        self.assertIs(events[2].app, self.app)
+
+    def test_releases(self):
+        watch = self.watch(['releases'])
+        self.server.set_payload('/apps/bench-app-1/releases', fixtures.releases(5))
+
+        events = sorted(self.events(watch, 2), key=lambda e: e.new.name)
+
+        self.assertEqual([type(e) for e in events], [ReleaseCreated] * 2)
+        self.assertEqual([e.new.name for e in events], ['v4', 'v5'])
+
+    def test_config(self):
+        watch = self.watch(['config'])
+
+        config = fixtures.config_vars(3)
+        config['VAR_0'] = 'changed'
+        del config['VAR_1']
+        config['NEW'] = 'value'
+        self.server.set_payload('/apps/bench-app-1/config_vars', config)
+
+        events = self.events(watch, 3)
+
+        self.assertEqual([type(e) for e in events], [ConfigVarChanged] * 3)
+        self.assertEqual(
+            [(e.key, e.old, e.new) for e in events],
+            [('NEW', None, 'value'),
+             ('VAR_0', fixtures.config_vars(3)['VAR_0'], 'changed'),
+             ('VAR_1', fixtures.config_vars(3)['VAR_1'], None)])
+
+    def test_unchanged_polls_are_conditional(self):
+        watch = self.watch(['processes'])
+        self.server.reset_stats()
+
+        while watch.polls < 4:
+            self.assertIsNone(watch.get(0.01))
+
+        self.assertGreater(self.server.stats['not_modified'], 0)
+        self.assertEqual(self.server.stats['not_modified'], self.server.stats['requests'])
+        self.assertIsNone(self.h._cache)
+
+    def test_callback(self):
+        events = []
+        self.watch(['releases'], callback=events.append)
+        self.server.set_payload('/apps/bench-app-1/releases', fixtures.releases(4))
+
+        deadline = time.time() + 5
+        while not events and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual([e.new.name for e in events], ['v4'])
+
+    def test_close_unblocks_consumer(self):
+        watch = self.watch(['processes'])
+        consumed = []
+
+        consumer = Thread(target=lambda: consumed.extend(watch))
+        consumer.start()
+
+        watch.close()
+        consumer.join(5)
+
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(consumed, [])
+
+    def test_watcher_close_closes_every_watch(self):
+        watches = [self.watch(['processes']), self.watch(['config'])]
+
+        self.h.watcher.close()
+
+        self.assertTrue(all(watch.closed for watch in watches))
+        self.assertTrue(all(watch.get(5) is None for watch in watches))
+
+    def test_unknown_attr(self):
+        self.assertRaises(ValueError, self.app.watch, ['nope'])
+
+
+if __name__ == '__main__':
+    unittest.main()